@@ -0,0 +1,58 @@
+"""
+Буферизованный вывод отчётов анализаторов в консоль
+"""
+
+import io
+import sys
+import time
+from contextlib import redirect_stdout
+from functools import wraps
+
+
+class BatchedWriter(io.TextIOBase):
+    """Копит текст и пишет его в поток пачками: по объёму или раз в interval секунд"""
+
+    def __init__(self, stream, limit: int = 64 * 1024, interval: float = 0.5):
+        self._stream = stream
+        self._limit = limit
+        self._interval = interval
+        self._parts = []
+        self._size = 0
+        self._last_flush = time.monotonic()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        self._parts.append(text)
+        self._size += len(text)
+        # Долгий отчёт не молчит до конца: пачка уходит, когда накопилась или устарела
+        if self._size >= self._limit or time.monotonic() - self._last_flush >= self._interval:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self._parts:
+            self._stream.write(''.join(self._parts))
+            self._parts.clear()
+            self._size = 0
+        self._stream.flush()
+        self._last_flush = time.monotonic()
+
+
+def buffered_output(func):
+    """
+    Выводит печать функции в stdout пачками, а не отдельной записью на каждый print
+
+    Перед долгим шагом функция может вызвать sys.stdout.flush(), чтобы показать
+    уже напечатанное. Остаток выводится и при исключении.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        writer = BatchedWriter(sys.stdout)
+        try:
+            with redirect_stdout(writer):
+                return func(*args, **kwargs)
+        finally:
+            writer.flush()
+    return wrapper
@@ -4,13 +4,29 @@ Fansy-SCRIPT Code Analyzer
 Инструмент для анализа кода, поиска ошибок и проверки совместимости функций
 """
 
+import os
 import re
-from typing import Dict, List, Tuple, Optional
+import sys
+from typing import Dict, List, Set, Tuple, Optional
 from dataclasses import dataclass
 from collections import defaultdict
+from functools import lru_cache
+from itertools import compress
+from operator import attrgetter, ne
 
+from console_output import buffered_output
 
-@dataclass
+try:
+    # Необязательный модуль regex на порядок быстрее re на IGNORECASE-поиске по кириллице
+    import regex as log_regex
+except ImportError:
+    log_regex = re
+
+# __slots__ для dataclass доступны с Python 3.10; на старых версиях - обычные классы
+DATACLASS_OPTIONS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**DATACLASS_OPTIONS)
 class FunctionSignature:
     """Сигнатура функции FANSY-SCRIPT"""
     name: str
@@ -27,7 +43,7 @@ class FunctionSignature:
         return f"{self.module}->{self.name}({params_str})"
 
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class FunctionCall:
     """Вызов функции в коде"""
     name: str
@@ -41,7 +57,7 @@ class FunctionCall:
         return f"Line {self.line_number}: {self.module}->{self.name}(...{self.args_count} args)"
 
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class ErrorLogEntry:
     """Запись из лога ошибок"""
     error_type: str
@@ -58,13 +74,20 @@ class FansyScriptParser:
     # Регулярные выражения для парсинга
     FUNC_HEADER_RE = re.compile(r'//\s*(\w+)\((.*?)\)\s*//==\s*(.*?)$', re.MULTILINE)
     USES_RE = re.compile(r'uses\s+([\w,\s_]+);', re.IGNORECASE)
-    FUNC_CALL_RE = re.compile(r'(\w+)->(\w+)\s*\((.*?)\)', re.DOTALL)
+    # Вызов MODULE->Function(args) в пределах одной строки, без имени модуля: шаблон
+    # начинается с литерала '->', который re находит быстрым поиском подстроки, а не
+    # пробует \w+ с каждой позиции. Имя модуля (\w+ вплотную перед '->') дочитывает
+    # parse_function_calls; пробелы перед '(' - только горизонтальные, аргументы до
+    # первой ')' на той же строке
+    CALL_TAIL_RE = re.compile(r'->(\w+)[^\S\n]*\(([^\n]*?)\)')
     VAR_DECL_RE = re.compile(r'var\s+([\w\s,.:=()\'"\-+\[\]]+);', re.IGNORECASE)
     
     def __init__(self):
         self.functions: Dict[str, FunctionSignature] = {}
         self.calls: List[FunctionCall] = []
         self.modules_used: List[str] = []
+        # Кэш разбора файлов: путь -> ((mtime, размер), результат без текста кода)
+        self._file_cache: Dict[str, Tuple[Tuple[int, int], Dict]] = {}
         
     def parse_function_header(self, code: str) -> Optional[FunctionSignature]:
         """Парсит заголовок функции"""
@@ -110,30 +133,58 @@ class FansyScriptParser:
     def parse_function_calls(self, code: str) -> List[FunctionCall]:
         """Находит все вызовы функций в коде"""
         calls = []
-        lines = code.split('\n')
+        line_number = 1
+        line_start = 0
+        line_text = None
+        is_comment = False
+        pos = 0
         
-        for i, line in enumerate(lines, 1):
+        # Ищем вызовы функций MODULE->Function(...) одним проходом по файлу
+        while True:
+            match = self.CALL_TAIL_RE.search(code, pos)
+            if match is None:
+                break
+            
+            # Имя модуля - слово вплотную перед стрелкой
+            arrow = match.start()
+            start = arrow
+            while start > 0 and (code[start - 1].isalnum() or code[start - 1] == '_'):
+                start -= 1
+            if start == arrow:
+                # Без имени модуля это не вызов; следующий может начинаться внутри хвоста
+                pos = arrow + 1
+                continue
+            pos = match.end()
+            
+            # Строка вызова определяется только для строк, где есть совпадения
+            match_line_start = code.rfind('\n', 0, start) + 1
+            if line_text is None or match_line_start != line_start:
+                line_number += code.count('\n', line_start, match_line_start)
+                line_start = match_line_start
+                line_end = code.find('\n', start)
+                line_text = code[line_start:line_end if line_end != -1 else len(code)].strip()
+                is_comment = line_text.startswith('//')
+            
             # Пропускаем комментарии
-            if line.strip().startswith('//'):
+            if is_comment:
                 continue
             
-            # Ищем вызовы функций MODULE->Function(...)
-            for match in self.FUNC_CALL_RE.finditer(line):
-                module = match.group(1)
-                func_name = match.group(2)
-                args_str = match.group(3)
-                
-                # Подсчитываем аргументы (упрощённо)
-                args = self._parse_arguments(args_str)
-                
-                calls.append(FunctionCall(
-                    name=func_name,
-                    module=module,
-                    args_count=len(args),
-                    line_number=i,
-                    line_text=line.strip(),
-                    args=args
-                ))
+            # Имена модулей и функций повторяются тысячи раз - храним по одному экземпляру
+            module = sys.intern(code[start:arrow])
+            func_name = sys.intern(match.group(1))
+            args_str = match.group(2)
+            
+            # Подсчитываем аргументы (упрощённо)
+            args = self._parse_arguments(args_str)
+            
+            calls.append(FunctionCall(
+                name=func_name,
+                module=module,
+                args_count=len(args),
+                line_number=line_number,
+                line_text=line_text,
+                args=args
+            ))
         
         return calls
     
@@ -142,34 +193,68 @@ class FansyScriptParser:
         if not args_str.strip():
             return []
         
+        pieces = args_str.split(',')
+        
+        # Без вложенных скобок все запятые верхнего уровня - хватает str.split
+        if '(' not in args_str and ')' not in args_str:
+            if not pieces[-1]:
+                pieces.pop()  # Завершающая запятая не даёт пустого аргумента
+            return [piece.strip() for piece in pieces]
+        
         # Упрощённый парсинг - просто по запятым на верхнем уровне
         # TODO: Учитывать вложенные вызовы и строки
+        # Запятая верхнего уровня, если скобки перед ней сбалансированы; баланс
+        # считается str.count по кускам между запятыми, а не по каждому символу
         args = []
         level = 0
-        current_arg = []
+        start = 0
+        last = len(pieces) - 1
         
-        for char in args_str:
-            if char == '(':
-                level += 1
-                current_arg.append(char)
-            elif char == ')':
-                level -= 1
-                current_arg.append(char)
-            elif char == ',' and level == 0:
-                args.append(''.join(current_arg).strip())
-                current_arg = []
-            else:
-                current_arg.append(char)
+        for i, piece in enumerate(pieces):
+            level += piece.count('(') - piece.count(')')
+            if level == 0 and i < last:
+                args.append(','.join(pieces[start:i + 1]).strip())
+                start = i + 1
         
-        if current_arg:
-            args.append(''.join(current_arg).strip())
+        tail = ','.join(pieces[start:])
+        if tail:
+            args.append(tail.strip())
         
         return args
     
     def analyze_file(self, filepath: str) -> Dict:
-        """Анализирует файл с кодом FANSY-SCRIPT"""
+        """
+        Анализирует файл с кодом FANSY-SCRIPT
+        
+        Разбор кэшируется в парсере по (путь, mtime, размер): повторный вызов
+        для неизменённого файла только перечитывает текст кода ('code' в кэше
+        не хранится). Списки в результате общие для всех вызовов - не изменяйте
+        их на месте.
+        """
+        path = os.path.abspath(filepath)
+        st = os.stat(path)
+        key = (st.st_mtime_ns, st.st_size)
+        
+        cached = self._file_cache.get(path)
+        if cached is not None and cached[0] == key:
+            return {**cached[1], 'code': self._read_code(path)}
+        
+        result = self._analyze_file_uncached(path)
+        self._file_cache[path] = (key, {k: v for k, v in result.items() if k != 'code'})
+        return result
+    
+    @staticmethod
+    def _read_code(filepath: str) -> str:
+        """Текст файла с кодом"""
+        # Читаем целиком как текст, а не через mmap и bytes-шаблоны: результат
+        # отдаёт весь код ('code'), \w должен совпадать с кириллицей, а нумерация
+        # строк опирается на преобразование переводов строк в текстовом режиме
         with open(filepath, 'r', encoding='utf-8') as f:
-            code = f.read()
+            return f.read()
+    
+    def _analyze_file_uncached(self, filepath: str) -> Dict:
+        """Читает и разбирает файл без кэша"""
+        code = self._read_code(filepath)
         
         # Извлекаем информацию
         header = self.parse_function_header(code)
@@ -180,86 +265,109 @@ class FansyScriptParser:
             'header': header,
             'modules': modules,
             'calls': calls,
-            'total_lines': len(code.split('\n')),
+            'total_lines': code.count('\n') + 1,  # Как len(code.split('\n')), без списка строк
             'code': code
         }
 
 
+@lru_cache(maxsize=4096)
+def _unknown_function_message(module: str, name: str) -> str:
+    """Текст предупреждения о неизвестной функции (одна строка на пару module/name)"""
+    return f"Функция {module}.{name} не найдена в базе сигнатур"
+
+
+@lru_cache(maxsize=4096)
+def _param_count_message(expected: int, passed: int) -> str:
+    """Текст ошибки о числе параметров (одна строка на пару expected/passed)"""
+    return f"Ожидается {expected} параметров, передано {passed}"
+
+
 class CompatibilityChecker:
     """Проверка совместимости вызовов функций"""
     
     def __init__(self):
-        self.signatures: Dict[str, FunctionSignature] = {}
+        self.signatures: Dict[Tuple[str, str], FunctionSignature] = {}  # (module, name) -> sig
         self.issues: List[Dict] = []
     
     def register_signature(self, sig: FunctionSignature):
         """Регистрирует сигнатуру функции"""
-        key = f"{sig.module}.{sig.name}"
-        self.signatures[key] = sig
+        self.signatures[(sys.intern(sig.module), sys.intern(sig.name))] = sig
     
     def check_call(self, call: FunctionCall) -> Optional[Dict]:
         """Проверяет вызов функции на совместимость"""
-        key = f"{call.module}.{call.name}"
+        sig = self.signatures.get((call.module, call.name))
         
-        if key not in self.signatures:
+        if sig is None:
             return {
                 'type': 'UNKNOWN_FUNCTION',
                 'severity': 'WARNING',
                 'call': call,
-                'message': f"Функция {key} не найдена в базе сигнатур"
+                'message': _unknown_function_message(call.module, call.name)
             }
         
-        sig = self.signatures[key]
-        
         if call.args_count != sig.param_count():
             return {
                 'type': 'PARAM_COUNT_MISMATCH',
                 'severity': 'ERROR',
                 'call': call,
                 'signature': sig,
-                'message': f"Ожидается {sig.param_count()} параметров, передано {call.args_count}"
+                'message': _param_count_message(sig.param_count(), call.args_count)
             }
         
         return None
     
     def check_all_calls(self, calls: List[FunctionCall]) -> List[Dict]:
         """Проверяет все вызовы и возвращает список проблем"""
-        issues = []
+        # Плоская таблица (module, name) -> ожидаемое число параметров: в проходе
+        # сравниваются только ключ и args_count, запись о проблеме строит check_call
+        expected_counts = {key: sig.param_count() for key, sig in self.signatures.items()}
         
-        for call in calls:
-            issue = self.check_call(call)
-            if issue:
-                issues.append(issue)
+        # Сравнение выполняется цепочкой map/compress на C, без цикла в байткоде
+        expected = map(expected_counts.get, map(attrgetter('module', 'name'), calls))
+        mismatched = map(ne, expected, map(attrgetter('args_count'), calls))
         
-        return issues
+        return [self.check_call(call) for call in compress(calls, mismatched)]
 
 
 class ErrorLogParser:
     """Парсер логов ошибок"""
     
+    # Шаблоны в порядке приоритета: для строки берётся первый сработавший.
+    # \s заменён на [^\S\n], чтобы совпадение не выходило за пределы строки
     ERROR_PATTERNS = [
-        (r'Не все входные параметры означены.*функци[ияю]\s+(\w+).*строка\s+(\d+)', 'PARAM_NOT_DEFINED'),
-        (r'Ошибка.*doc_id[=:\s]+(\d+)', 'DOC_ERROR'),
-        (r'dir_id[=:\s]+(\d+)', 'DIR_ERROR'),
+        (log_regex.compile(pattern, log_regex.IGNORECASE), error_type)
+        for pattern, error_type in [
+            (r'Не все входные параметры означены.*функци[ияю][^\S\n]+(\w+).*строка[^\S\n]+(\d+)', 'PARAM_NOT_DEFINED'),
+            (r'Ошибка.*doc_id(?:[=:]|[^\S\n])+(\d+)', 'DOC_ERROR'),
+            (r'dir_id(?:[=:]|[^\S\n])+(\d+)', 'DIR_ERROR'),
+        ]
     ]
     
     def parse_log(self, log_text: str) -> List[ErrorLogEntry]:
         """Парсит лог и извлекает записи об ошибках"""
-        entries = []
+        # Каждый шаблон проходит весь лог одним finditer (с быстрым поиском
+        # литерального префикса); для строки остаётся совпадение самого
+        # приоритетного шаблона. Ключ - смещение начала строки
+        found = {}
+        for pattern, error_type in self.ERROR_PATTERNS:
+            for match in pattern.finditer(log_text):
+                line_start = log_text.rfind('\n', 0, match.start()) + 1
+                if line_start not in found:
+                    found[line_start] = (error_type, match)
         
-        lines = log_text.split('\n')
-        for line in lines:
-            for pattern, error_type in self.ERROR_PATTERNS:
-                match = re.search(pattern, line, re.IGNORECASE)
-                if match:
-                    entry = ErrorLogEntry(
-                        error_type=error_type,
-                        function_name=match.group(1) if match.lastindex >= 1 else '',
-                        line_number=int(match.group(2)) if match.lastindex >= 2 else 0,
-                        message=line
-                    )
-                    entries.append(entry)
-                    break
+        entries = []
+        for line_start in sorted(found):
+            error_type, match = found[line_start]
+            line_end = log_text.find('\n', match.end())
+            if line_end == -1:
+                line_end = len(log_text)
+            
+            entries.append(ErrorLogEntry(
+                error_type=error_type,
+                function_name=match.group(1) if match.lastindex >= 1 else '',
+                line_number=int(match.group(2)) if match.lastindex >= 2 else 0,
+                message=log_text[line_start:line_end]
+            ))
         
         return entries
 
@@ -268,63 +376,82 @@ class DependencyAnalyzer:
     """Анализатор зависимостей между функциями и таблицами"""
     
     def __init__(self):
-        self.function_calls: Dict[str, List[str]] = defaultdict(list)  # func -> [called_funcs]
-        self.table_access: Dict[str, List[str]] = defaultdict(list)    # func -> [tables]
+        # Множества с сохранением порядка добавления (ключи dict): повторный
+        # вызов той же функции или таблицы не создаёт дублирующее ребро
+        self.function_calls: Dict[str, Dict[str, None]] = defaultdict(dict)  # func -> {called_funcs}
+        self.table_access: Dict[str, Dict[str, None]] = defaultdict(dict)    # func -> {tables}
+        self.called_by: Dict[str, Dict[str, None]] = defaultdict(dict)       # func -> {callers}
     
     def add_function_call(self, caller: str, callee: str):
         """Регистрирует вызов функции"""
-        self.function_calls[caller].append(callee)
+        self.function_calls[caller][callee] = None
+        self.called_by[callee][caller] = None
     
     def add_table_access(self, function: str, table: str):
         """Регистрирует обращение к таблице"""
-        self.table_access[function].append(table)
+        self.table_access[function][table] = None
     
     def get_call_chain(self, function: str, max_depth: int = 5) -> List[List[str]]:
         """Возвращает цепочку вызовов от функции"""
         chains = []
+        path: List[str] = []      # Текущая цепочка, общая для всего обхода
+        on_path: Set[str] = set()  # Те же функции для проверки циклов за O(1)
+        stack = [(function, 0)]
         
-        def traverse(func: str, chain: List[str], depth: int):
-            if depth > max_depth or func in chain:  # Защита от циклов
-                return
+        while stack:
+            func, depth = stack.pop()
             
-            new_chain = chain + [func]
+            # Возвращаемся к уровню, на котором находится func
+            while len(path) > depth:
+                on_path.discard(path.pop())
+            
+            if depth > max_depth or func in on_path:  # Защита от циклов
+                continue
             
-            if func not in self.function_calls or not self.function_calls[func]:
-                chains.append(new_chain)
-                return
+            path.append(func)
+            on_path.add(func)
             
-            for called in self.function_calls[func]:
-                traverse(called, new_chain, depth + 1)
+            callees = self.function_calls.get(func)
+            if not callees:
+                chains.append(path.copy())
+                continue
+            
+            # В обратном порядке, чтобы цепочки шли в порядке вызовов
+            for called in reversed(callees):
+                stack.append((called, depth + 1))
         
-        traverse(function, [], 0)
         return chains
     
     def generate_mermaid_graph(self, function: str, include_tables: bool = True) -> str:
         """Генерирует Mermaid-граф зависимостей"""
         lines = ["graph TD"]
         
+        # Сама функция и те, кто её вызывает - по обратному индексу, без обхода всех рёбер
+        relevant = dict.fromkeys([function, *self.called_by.get(function, {})])
+        
         # Добавляем вызовы функций
-        for caller, callees in self.function_calls.items():
-            if caller == function or function in self.function_calls.get(caller, []):
-                for callee in callees:
-                    lines.append(f"    {caller}[{caller}] --> {callee}[{callee}]")
+        for caller in relevant:
+            for callee in self.function_calls.get(caller, {}):
+                lines.append(f"    {caller}[{caller}] --> {callee}[{callee}]")
         
         # Добавляем таблицы
         if include_tables:
-            for func, tables in self.table_access.items():
-                if func == function or function in self.function_calls.get(func, []):
-                    for table in tables:
-                        lines.append(f"    {func}[{func}] -.-> {table}[({table})]")
+            for func in relevant:
+                for table in self.table_access.get(func, {}):
+                    lines.append(f"    {func}[{func}] -.-> {table}[({table})]")
         
         return '\n'.join(lines)
 
 
+@buffered_output
 def main():
     """Демонстрация использования инструментов"""
     print("=" * 70)
     print("Fansy-SCRIPT Code Analyzer")
     print("=" * 70)
     print()
+    # Разбор большого файла долгий - заголовок показываем до него
+    sys.stdout.flush()
     
     # Парсим файл с проблемной функцией
     parser = FansyScriptParser()
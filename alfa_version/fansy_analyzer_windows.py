@@ -7,12 +7,19 @@ Fansy-SCRIPT Code Analyzer (Windows version)
 import re
 import sys
 import os
+import heapq
 from typing import Dict, List, Tuple, Optional
 from dataclasses import dataclass
-from collections import defaultdict
+from collections import Counter, defaultdict
+from operator import itemgetter
 
+from console_output import buffered_output
 
-@dataclass
+# __slots__ для dataclass доступны с Python 3.10; на старых версиях - обычные классы
+DATACLASS_OPTIONS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**DATACLASS_OPTIONS)
 class FunctionSignature:
     """Сигнатура функции FANSY-SCRIPT"""
     name: str
@@ -29,7 +36,7 @@ class FunctionSignature:
         return f"{self.module}->{self.name}({params_str})"
 
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class FunctionCall:
     """Вызов функции в коде"""
     name: str
@@ -104,14 +111,16 @@ class FansyScriptParser:
         lines = code.split('\n')
         
         for i, line in enumerate(lines, 1):
-            # Пропускаем комментарии
-            if line.strip().startswith('//'):
+            # Пропускаем комментарии (обрезанная строка нужна и для line_text)
+            line_text = line.strip()
+            if line_text.startswith('//'):
                 continue
             
             # Ищем вызовы функций MODULE->Function(...)
             for match in self.FUNC_CALL_RE.finditer(line):
-                module = match.group(1)
-                func_name = match.group(2)
+                # Имена модулей и функций повторяются тысячи раз - храним по одному экземпляру
+                module = sys.intern(match.group(1))
+                func_name = sys.intern(match.group(2))
                 args_str = match.group(3)
                 
                 # Подсчитываем аргументы (упрощённо)
@@ -122,7 +131,7 @@ class FansyScriptParser:
                     module=module,
                     args_count=len(args),
                     line_number=i,
-                    line_text=line.strip(),
+                    line_text=line_text,
                     args=args
                 ))
         
@@ -134,25 +143,22 @@ class FansyScriptParser:
             return []
         
         # Упрощённый парсинг - просто по запятым на верхнем уровне
+        # Аргументы вырезаются срезами по индексам, без списка символов
         args = []
         level = 0
-        current_arg = []
+        start = 0
         
-        for char in args_str:
+        for i, char in enumerate(args_str):
             if char == '(':
                 level += 1
-                current_arg.append(char)
             elif char == ')':
                 level -= 1
-                current_arg.append(char)
             elif char == ',' and level == 0:
-                args.append(''.join(current_arg).strip())
-                current_arg = []
-            else:
-                current_arg.append(char)
+                args.append(args_str[start:i].strip())
+                start = i + 1
         
-        if current_arg:
-            args.append(''.join(current_arg).strip())
+        if start < len(args_str):
+            args.append(args_str[start:].strip())
         
         return args
     
@@ -170,11 +176,12 @@ class FansyScriptParser:
             'header': header,
             'modules': modules,
             'calls': calls,
-            'total_lines': len(code.split('\n')),
+            'total_lines': code.count('\n') + 1,  # Как len(code.split('\n')), без списка строк
             'code': code
         }
 
 
+@buffered_output
 def main():
     print("=" * 70)
     print("Fansy-SCRIPT Code Analyzer (Windows)")
@@ -220,6 +227,8 @@ def main():
     print(f"📄 Анализ файла: {os.path.basename(filepath)}")
     print(f"   Полный путь: {os.path.abspath(filepath)}")
     print()
+    # Разбор большого файла долгий - заголовок показываем до него
+    sys.stdout.flush()
     
     try:
         # Парсим файл
@@ -259,20 +268,16 @@ def main():
         if result['calls']:
             print(f"🔧 Статистика вызовов функций:")
             
-            # Группируем по модулям
-            by_module = defaultdict(list)
-            for call in result['calls']:
-                by_module[call.module].append(call)
+            # Считаем вызовы за один проход, затем раскладываем счётчики по модулям
+            call_counts = Counter((call.module, call.name) for call in result['calls'])
+            by_module = defaultdict(dict)
+            for (module, func_name), count in call_counts.items():
+                by_module[module][func_name] = count
             
-            for module, calls in sorted(by_module.items()):
-                print(f"\n   Модуль {module}: {len(calls)} вызовов")
+            for module, by_name in sorted(by_module.items()):
+                print(f"\n   Модуль {module}: {sum(by_name.values())} вызовов")
                 
-                # Группируем по именам функций
-                by_name = defaultdict(int)
-                for call in calls:
-                    by_name[call.name] += 1
-                
-                for func_name, count in sorted(by_name.items(), key=lambda x: -x[1])[:5]:
+                for func_name, count in heapq.nlargest(5, by_name.items(), key=itemgetter(1)):
                     print(f"      - {func_name}: {count}x")
                 
                 if len(by_name) > 5:
@@ -283,10 +288,12 @@ def main():
         interesting_functions = ['Get_NDFL_Nach', 'Get_NDFL', 'NDFL']
         found_interesting = []
         
+        # Имена приводим к нижнему регистру один раз, а не для каждой цели
+        lowered_calls = [(c, c.name.lower()) for c in result['calls']]
+        
         for target in interesting_functions:
-            matching = [c for c in result['calls'] if target.lower() in c.name.lower()]
-            if matching:
-                found_interesting.extend(matching)
+            target_lower = target.lower()
+            found_interesting.extend(c for c, name_lower in lowered_calls if target_lower in name_lower)
         
         if found_interesting:
             print(f"🔍 Найдены интересные вызовы (NDFL-related):")
@@ -309,7 +316,8 @@ def main():
         print(f"   {type(e).__name__}: {e}")
         print()
         import traceback
-        traceback.print_exc()
+        # В тот же буферизованный stdout, иначе stderr обогнал бы заголовок ошибки
+        traceback.print_exc(file=sys.stdout)
 
 
 if __name__ == '__main__':
@@ -8,15 +8,48 @@ import fdb
 import time
 import json
 import threading
+import itertools
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, FrozenSet
 from collections import deque
+from bisect import bisect_left, insort
 import re
+import sys
+
+# orjson (если установлен) кодирует JSON на C в несколько раз быстрее стандартного json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _iso(ns: int) -> str:
+    """Время в наносекундах (time.time_ns) в ISO-строку"""
+    return datetime.fromtimestamp(ns / 1e9).isoformat()
+
+
+def _dumps(obj) -> bytes:
+    """Сериализовать объект в JSON (UTF-8 байты)"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
 
 
 class FirebirdTracer:
     """Трейсер SQL-запросов к Firebird"""
     
+    # Таблицы после FROM/JOIN/INSERT INTO/UPDATE - одним проходом по тексту запроса.
+    # Голый INTO не берём (MERGE INTO, SELECT ... INTO :var); в UPDATE OR INSERT INTO t
+    # таблица - после INSERT INTO, а не слово OR после UPDATE
+    TABLE_RE = re.compile(r'\b(?:FROM|JOIN|INSERT\s+INTO|UPDATE(?!\s+OR\b))\s+([A-Za-z_][A-Za-z0-9_]*)', re.IGNORECASE)
+    # Тип запроса по первому слову (все ключевые слова - по 6 символов).
+    # Отдельный срез префикса дешевле, чем ветка ^\s*(SELECT|...) в TABLE_RE:
+    # общая регулярка пробует её на каждой позиции и работает медленнее
+    QUERY_TYPES = {'SELECT': 'SELECT', 'INSERT': 'INSERT', 'UPDATE': 'UPDATE', 'DELETE': 'DELETE'}
+    # Столбцы истории в export_to_json
+    HISTORY_COLUMNS = ('id', 'sql', 'params', 'type', 'tables', 'start_ns', 'end_ns',
+                       'start_time', 'end_time', 'duration', 'rows_affected', 'error', 'status')
+    
     def __init__(self, host: str, database: str, user: str, password: str, max_history: int = 1000):
         self.host = host
         self.database = database
@@ -27,8 +60,12 @@ class FirebirdTracer:
         # История запросов (circular buffer)
         self.query_history = deque(maxlen=max_history)
         self.active_queries = {}  # query_id -> query_info
-        self.query_counter = 0
-        self.lock = threading.Lock()
+        self._id_gen = itertools.count()  # next() атомарен под GIL - блокировка для id не нужна
+        
+        # Отдельная блокировка на каждую структуру: чтение истории не ждёт обновления статистики
+        self._stats_lock = threading.Lock()  # self.stats
+        self._history_lock = threading.Lock()  # query_history и агрегаты по ней
+        self._active_lock = threading.Lock()  # active_queries
         
         # Статистика
         self.stats = {
@@ -38,6 +75,11 @@ class FirebirdTracer:
             'by_type': {'SELECT': 0, 'INSERT': 0, 'UPDATE': 0, 'DELETE': 0, 'OTHER': 0}
         }
         
+        # Агрегаты по запросам из истории - обновляются при добавлении и вытеснении
+        self._table_stats = {}  # table -> {'reads', 'writes', 'total_time', 'queries'}
+        self._slow = []  # (-duration, seq, query_info), отсортирован по убыванию времени
+        self._history_seq = 0  # Сколько запросов всего попало в историю
+        
         self.connection = None
         self.is_running = False
         
@@ -66,39 +108,15 @@ class FirebirdTracer:
     
     def _get_query_type(self, sql: str) -> str:
         """Определить тип SQL-запроса"""
-        sql_upper = sql.strip().upper()
-        if sql_upper.startswith('SELECT'):
-            return 'SELECT'
-        elif sql_upper.startswith('INSERT'):
-            return 'INSERT'
-        elif sql_upper.startswith('UPDATE'):
-            return 'UPDATE'
-        elif sql_upper.startswith('DELETE'):
-            return 'DELETE'
-        else:
-            return 'OTHER'
+        return self.QUERY_TYPES.get(sql.lstrip()[:6].upper(), 'OTHER')
     
-    def _extract_tables(self, sql: str) -> List[str]:
+    def _extract_tables(self, sql: str) -> FrozenSet[str]:
         """Извлечь имена таблиц из SQL"""
-        # Упрощённый парсинг - ищем FROM и JOIN
-        tables = []
-        
-        # FROM clause
-        from_match = re.search(r'FROM\s+(\w+)', sql, re.IGNORECASE)
-        if from_match:
-            tables.append(from_match.group(1))
-        
-        # JOIN clauses
-        join_matches = re.finditer(r'JOIN\s+(\w+)', sql, re.IGNORECASE)
-        for match in join_matches:
-            tables.append(match.group(1))
-        
-        # INSERT INTO / UPDATE
-        insert_match = re.search(r'(?:INSERT\s+INTO|UPDATE)\s+(\w+)', sql, re.IGNORECASE)
-        if insert_match:
-            tables.append(insert_match.group(1))
-        
-        return list(set(tables))  # Уникальные
+        # Упрощённый парсинг - FROM, JOIN, INSERT INTO и UPDATE за один проход.
+        # Уникальные имена в верхнем регистре (так Firebird хранит имена без кавычек),
+        # интернированные - в истории и статистике по таблицам один экземпляр на имя.
+        # frozenset отдаём как есть: потребители только перебирают таблицы
+        return frozenset(sys.intern(match.group(1).upper()) for match in self.TABLE_RE.finditer(sql))
     
     def trace_query(self, sql: str, params: tuple = None) -> Dict[str, Any]:
         """
@@ -110,31 +128,9 @@ class FirebirdTracer:
         if not self.connection:
             raise Exception("Нет подключения к БД. Вызовите connect() сначала.")
         
-        query_id = self.query_counter
-        self.query_counter += 1
-        
-        query_type = self._get_query_type(sql)
-        tables = self._extract_tables(sql)
+        query_info = self._begin_query(sql, params)
+        query_type = query_info['type']
         
-        query_info = {
-            'id': query_id,
-            'sql': sql,
-            'params': params,
-            'type': query_type,
-            'tables': tables,
-            'start_time': datetime.now().isoformat(),
-            'end_time': None,
-            'duration': None,
-            'rows_affected': 0,
-            'error': None,
-            'status': 'RUNNING'
-        }
-        
-        # Добавляем в активные
-        with self.lock:
-            self.active_queries[query_id] = query_info
-        
-        start = time.time()
         cursor = None
         result = []
         
@@ -159,37 +155,118 @@ class FirebirdTracer:
         except Exception as e:
             query_info['error'] = str(e)
             query_info['status'] = 'ERROR'
-            with self.lock:
-                self.stats['errors'] += 1
             
         finally:
             if cursor:
                 cursor.close()
             
-            end = time.time()
-            duration = end - start
-            
-            query_info['end_time'] = datetime.now().isoformat()
-            query_info['duration'] = duration
-            
-            # Обновляем статистику
-            with self.lock:
-                self.stats['total_queries'] += 1
-                self.stats['total_time'] += duration
-                self.stats['by_type'][query_type] += 1
-                
-                # Перемещаем из активных в историю
-                del self.active_queries[query_id]
-                self.query_history.append(query_info)
+            self._record_query(query_info)
         
         return {
             'query_info': query_info,
             'result': result if query_type == 'SELECT' else None
         }
     
+    def _begin_query(self, sql: str, params: tuple = None) -> Dict[str, Any]:
+        """Завести запись о запросе и добавить её в активные"""
+        query_id = next(self._id_gen)
+        
+        query_info = {
+            'id': query_id,
+            'sql': sql,
+            'params': params,
+            'type': self._get_query_type(sql),
+            'tables': self._extract_tables(sql),
+            # Сырые наносекунды: в ISO-строки переводим только при экспорте
+            'start_ns': time.time_ns(),
+            'end_ns': None,
+            'duration': None,
+            'rows_affected': 0,
+            'error': None,
+            'status': 'RUNNING'
+        }
+        
+        with self._active_lock:
+            self.active_queries[query_id] = query_info
+        
+        return query_info
+    
+    def _record_query(self, query_info: Dict[str, Any]):
+        """Завершить запрос: посчитать время, обновить статистику, перенести в историю"""
+        query_info['end_ns'] = time.time_ns()
+        duration = (query_info['end_ns'] - query_info['start_ns']) / 1e9
+        query_info['duration'] = duration
+        
+        # Обновляем статистику
+        with self._stats_lock:
+            self.stats['total_queries'] += 1
+            self.stats['total_time'] += duration
+            self.stats['by_type'][query_info['type']] += 1
+            if query_info['status'] == 'ERROR':
+                self.stats['errors'] += 1
+        
+        # Перемещаем из активных в историю
+        with self._history_lock:
+            self._append_history(query_info)
+        with self._active_lock:
+            del self.active_queries[query_info['id']]
+    
+    def _append_history(self, query_info: Dict):
+        """Добавить запрос в историю и обновить агрегаты (вызывается под self._history_lock)"""
+        if len(self.query_history) == self.max_history:
+            # Самый старый запрос будет вытеснен - вычитаем его из агрегатов
+            self._update_aggregates(self.query_history[0], self._history_seq - self.max_history, -1)
+        
+        self._update_aggregates(query_info, self._history_seq, 1)
+        self.query_history.append(query_info)
+        self._history_seq += 1
+    
+    def _update_aggregates(self, query: Dict, seq: int, sign: int):
+        """Учесть (sign=1) или вычесть (sign=-1) запрос в статистике по таблицам и медленных"""
+        duration = query['duration'] or 0
+        is_read = query['type'] == 'SELECT'
+        is_write = query['type'] in ('INSERT', 'UPDATE', 'DELETE')
+        
+        for table in query['tables']:
+            stats = self._table_stats.get(table)
+            if stats is None:
+                stats = self._table_stats[table] = {
+                    'reads': 0,
+                    'writes': 0,
+                    'total_time': 0.0,
+                    'queries': 0
+                }
+            
+            stats['queries'] += sign
+            stats['total_time'] += sign * duration
+            if is_read:
+                stats['reads'] += sign
+            elif is_write:
+                stats['writes'] += sign
+            
+            if stats['queries'] == 0:
+                del self._table_stats[table]
+        
+        if duration:
+            key = (-duration, seq)
+            if sign > 0:
+                insort(self._slow, (*key, query))
+            else:
+                del self._slow[bisect_left(self._slow, key)]
+    
     def get_history(self, limit: int = 100, query_type: str = None) -> List[Dict]:
         """Получить историю запросов"""
-        with self.lock:
+        if limit > 0:
+            # Идём с конца истории и останавливаемся, набрав limit подходящих запросов
+            with self._history_lock:
+                recent = list(itertools.islice(
+                    (q for q in reversed(self.query_history) if not query_type or q['type'] == query_type),
+                    limit
+                ))
+            recent.reverse()
+            return recent
+        
+        with self._history_lock:
             history = list(self.query_history)
         
         # Фильтруем по типу если нужно
@@ -201,47 +278,37 @@ class FirebirdTracer:
     
     def get_active_queries(self) -> List[Dict]:
         """Получить активные (выполняющиеся) запросы"""
-        with self.lock:
+        with self._active_lock:
             return list(self.active_queries.values())
     
     def get_stats(self) -> Dict:
         """Получить статистику"""
-        with self.lock:
+        with self._stats_lock:
             stats = self.stats.copy()
-            stats['avg_time'] = stats['total_time'] / stats['total_queries'] if stats['total_queries'] > 0 else 0
+            stats['by_type'] = dict(stats['by_type'])
+        with self._active_lock:
             stats['active_queries'] = len(self.active_queries)
-            return stats
+        
+        stats['avg_time'] = stats['total_time'] / stats['total_queries'] if stats['total_queries'] > 0 else 0
+        return stats
     
     def get_slow_queries(self, threshold: float = 1.0, limit: int = 10) -> List[Dict]:
         """Получить медленные запросы (> threshold секунд)"""
-        with self.lock:
-            slow = [q for q in self.query_history if q['duration'] and q['duration'] > threshold]
-            slow.sort(key=lambda x: x['duration'], reverse=True)
-            return slow[:limit]
+        slow = []
+        
+        with self._history_lock:
+            # Список уже упорядочен по убыванию времени - берём верхушку
+            for neg_duration, _, query in self._slow:
+                if -neg_duration <= threshold or len(slow) >= limit:
+                    break
+                slow.append(query)
+        
+        return slow
     
     def get_table_stats(self) -> Dict[str, Dict]:
         """Статистика по таблицам"""
-        table_stats = {}
-        
-        with self.lock:
-            for query in self.query_history:
-                for table in query['tables']:
-                    if table not in table_stats:
-                        table_stats[table] = {
-                            'reads': 0,
-                            'writes': 0,
-                            'total_time': 0.0,
-                            'queries': 0
-                        }
-                    
-                    stats = table_stats[table]
-                    stats['queries'] += 1
-                    stats['total_time'] += query['duration'] or 0
-                    
-                    if query['type'] == 'SELECT':
-                        stats['reads'] += 1
-                    elif query['type'] in ('INSERT', 'UPDATE', 'DELETE'):
-                        stats['writes'] += 1
+        with self._history_lock:
+            table_stats = {table: dict(stats) for table, stats in self._table_stats.items()}
         
         # Вычисляем средние
         for table, stats in table_stats.items():
@@ -249,18 +316,42 @@ class FirebirdTracer:
         
         return table_stats
     
+    @staticmethod
+    def _export_row(query: Dict) -> list:
+        """Строка истории для экспорта - значения в порядке HISTORY_COLUMNS"""
+        end_ns = query['end_ns']
+        return [
+            query['id'], query['sql'], query['params'], query['type'], list(query['tables']),
+            query['start_ns'], end_ns,
+            _iso(query['start_ns']), _iso(end_ns) if end_ns is not None else None,
+            query['duration'], query['rows_affected'], query['error'], query['status']
+        ]
+    
+    @staticmethod
+    def _load_history_soa(history: Dict) -> List[Dict]:
+        """Развернуть историю из экспорта ({'columns', 'rows'}) обратно в список словарей"""
+        columns = history['columns']
+        return [dict(zip(columns, row)) for row in history['rows']]
+    
     def export_to_json(self, filename: str):
         """Экспорт истории в JSON"""
-        with self.lock:
-            data = {
-                'stats': self.get_stats(),
-                'history': list(self.query_history),
-                'table_stats': self.get_table_stats(),
-                'exported_at': datetime.now().isoformat()
-            }
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        # Каждый метод берёт свою блокировку сам - внешняя здесь не нужна
+        stats = self.get_stats()
+        with self._history_lock:
+            history = list(self.query_history)
+        table_stats = self.get_table_stats()
+        
+        # Пишем секциями, без общего документа в памяти. История - по столбцам:
+        # имена полей один раз в "columns", дальше по строке-массиву на запрос
+        with open(filename, 'wb') as f:
+            f.write(b'{"stats": ' + _dumps(stats))
+            f.write(b',\n"history": {"columns": ' + _dumps(self.HISTORY_COLUMNS) + b', "rows": [\n')
+            for i, query in enumerate(history):
+                if i:
+                    f.write(b',\n')
+                f.write(_dumps(self._export_row(query)))
+            f.write(b'\n]},\n"table_stats": ' + _dumps(table_stats))
+            f.write(b',\n"exported_at": ' + _dumps(datetime.now().isoformat()) + b'}\n')
         
         print(f"✅ Экспортировано в {filename}")
 
@@ -296,10 +387,26 @@ class TracedCursor:
         self._cursor = cursor
     
     def execute(self, sql: str, params: tuple = None):
-        # Вызываем трейсер
-        result = self.tracer.trace_query(sql, params)
-        # Возвращаем реальный курсор (уже выполнен)
-        return self._cursor
+        # Выполняем на своём курсоре и только записываем запрос в трейсер:
+        # trace_query выполнил бы SQL повторно на отдельном курсоре (с commit)
+        query_info = self.tracer._begin_query(sql, params)
+        
+        try:
+            if params:
+                self._cursor.execute(sql, params)
+            else:
+                self._cursor.execute(sql)
+        except Exception as e:
+            query_info['error'] = str(e)
+            query_info['status'] = 'ERROR'
+            raise
+        else:
+            query_info['rows_affected'] = self._cursor.rowcount
+            query_info['status'] = 'SUCCESS'
+        finally:
+            self.tracer._record_query(query_info)
+        
+        return self
     
     def fetchall(self):
         return self._cursor.fetchall()
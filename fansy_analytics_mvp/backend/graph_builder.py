@@ -6,23 +6,293 @@ Dependency Graph Builder
 
 import json
 import re
-from typing import Dict, List, Set, Tuple
-from collections import defaultdict
+import sys
+import heapq
+import itertools
+import random
+from typing import Dict, Iterable, List, Set, Tuple
+from collections import Counter, defaultdict
+from operator import itemgetter
 import networkx as nx
 from datetime import datetime
 
+# orjson (если установлен) кодирует JSON на C в несколько раз быстрее стандартного json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _dumps(obj) -> str:
+    """Сериализовать объект в JSON-строку"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj)
+
+
+# Статическая часть HTML-экспорта: между головой и хвостом пишутся данные графа
+_HTML_HEAD = """
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>Fansy Dependency Graph{title_suffix}</title>
+    <script src="https://unpkg.com/vis-network/standalone/umd/vis-network.min.js"></script>
+    <style>
+        body {{
+            font-family: Arial, sans-serif;
+            margin: 0;
+            padding: 20px;
+        }}
+        #mynetwork {{
+            width: 100%;
+            height: 800px;
+            border: 1px solid lightgray;
+        }}
+        .info {{
+            margin-bottom: 20px;
+            padding: 10px;
+            background: #f0f0f0;
+            border-radius: 5px;
+        }}
+        h1 {{
+            margin: 0 0 10px 0;
+        }}
+    </style>
+</head>
+<body>
+    <div class="info">
+        <h1>Граф зависимостей функций Fansy</h1>
+        {focus_info}
+        <p><strong>Функций:</strong> {nodes_count} | <strong>Связей:</strong> {edges_count}</p>
+    </div>
+    
+    <div id="mynetwork"></div>
+    
+    <script type="text/javascript">
+"""
+
+_HTML_TAIL = """        
+        var container = document.getElementById('mynetwork');
+        var data = {
+            nodes: nodes,
+            edges: edges
+        };
+        var options = {
+            nodes: {
+                shape: 'dot',
+                font: {
+                    size: 14
+                }
+            },
+            edges: {
+                arrows: 'to',
+                smooth: {
+                    type: 'cubicBezier'
+                }
+            },
+            physics: {
+                stabilization: {
+                    iterations: 200
+                },
+                barnesHut: {
+                    gravitationalConstant: -8000,
+                    springConstant: 0.04,
+                    springLength: 150
+                }
+            },
+            interaction: {
+                hover: true,
+                tooltipDelay: 100
+            }
+        };
+        
+        var network = new vis.Network(container, data, options);
+        
+        // Клик по узлу - показываем детали
+        network.on("click", function (params) {
+            if (params.nodes.length > 0) {
+                var nodeId = params.nodes[0];
+                alert('Функция: ' + nodeId + '\\n\\nДля подробностей смотрите консоль');
+                console.log('Node clicked:', nodeId, nodes.get(nodeId));
+            }
+        });
+    </script>
+</body>
+</html>
+"""
+
 
 class DependencyGraphBuilder:
     """Строитель графа зависимостей функций"""
     
+    # Точная betweenness до этого числа узлов, дальше - оценка по выборке источников
+    CENTRALITY_EXACT_LIMIT = 500
+    CENTRALITY_SAMPLES = 200
+    
+    # Цвета узлов по модулям
+    MODULE_COLORS = {
+        '_F_SPECTRE': '#FF6B6B',
+        '_F_BUX': '#4ECDC4',
+        '_F_DOC': '#45B7D1',
+        '_F_PIF': '#FFA07A',
+        '_F_ECO': '#98D8C8',
+        '_METAL_F': '#C7CEEA',
+        '_F_REPORT': '#FFDAB9'
+    }
+    DEFAULT_NODE_COLOR = '#95E1D3'
+    
     def __init__(self):
         self.graph = nx.DiGraph()
         self.functions = {}  # func_name -> func_info
-        self.call_counts = defaultdict(int)  # (caller, callee) -> count
+        self.call_counts = Counter()  # (caller, callee) -> count
+        
+        # Кэш аналитики: сбрасывается, когда add_function/add_call меняют версию графа
+        # (граф меняйте только через эти методы; закэшированные результаты не изменяйте)
+        self._version = 0
+        self._cache = {}
+        self._cache_version = 0
+        
+        # Номера модулей и функций для компактных событий SSE (словарь - /api/graph/dictionary)
+        self._module_ids = {}
+        self._function_ids = {}
+        self._name_id_seq = itertools.count()
+        
+    @property
+    def version(self) -> int:
+        """Версия графа: меняется при каждом add_function/add_call"""
+        return self._version
+    
+    def _name_id(self, ids: Dict[str, int], name: str) -> int:
+        """Номер имени; новое имя получает номер при первом обращении"""
+        name_id = ids.get(name)
+        if name_id is None:
+            # setdefault атомарен: при гонке двух потоков оба получат один номер
+            name_id = ids.setdefault(sys.intern(name), next(self._name_id_seq))
+        return name_id
+    
+    def get_module_id(self, module: str) -> int:
+        """Номер модуля"""
+        return self._name_id(self._module_ids, module)
+    
+    def get_function_id(self, name: str) -> int:
+        """Номер функции"""
+        return self._name_id(self._function_ids, name)
+    
+    def get_dictionary(self) -> Dict[str, Dict[str, int]]:
+        """Все выданные номера: {'modules': {имя: номер}, 'functions': {имя: номер}}"""
+        return {
+            'modules': dict(self._module_ids),
+            'functions': dict(self._function_ids)
+        }
+    
+    def _cached(self, key, compute):
+        """Вернуть результат compute() для текущей версии графа"""
+        version = self._version
+        if self._cache_version != version:
+            self._cache.clear()
+            self._cache_version = version
+        
+        if key in self._cache:
+            return self._cache[key]
+        
+        result = compute()
+        # Граф изменился, пока считали: результат мог застать старое состояние - не сохраняем
+        if self._version == version:
+            self._cache[key] = result
+        return result
+    
+    def _peek_cached(self, key):
+        """Закэшированный результат для текущей версии графа или None (без расчёта)"""
+        if self._cache_version != self._version:
+            return None
+        return self._cache.get(key)
+    
+    def _degrees(self) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """Входящие и исходящие степени всех узлов (один раз на версию графа)"""
+        return self._cached('degrees', lambda: (dict(self.graph.in_degree()), dict(self.graph.out_degree())))
+    
+    def _component_ids(self) -> Dict[str, int]:
+        """Номер компоненты слабой связности каждого узла (один раз на версию графа)"""
+        def compute():
+            components = nx.weakly_connected_components(self.graph)
+            return {node: i for i, component in enumerate(components) for node in component}
+        return self._cached('components', compute)
+    
+    def _index_adjacency(self) -> Tuple[List[str], List[Tuple[int, ...]]]:
+        """
+        Компактная копия графа: имена узлов и списки последователей по целочисленным индексам
+        
+        Строится одним проходом по рёбрам раз на версию графа. Обход по спискам
+        индексов заметно дешевле, чем по вложенным словарям networkx.
+        """
+        def compute():
+            names = list(self.graph)
+            index = {name: i for i, name in enumerate(names)}
+            succ = [tuple(index[callee] for callee in self.graph.successors(name)) for name in names]
+            return names, succ
+        return self._cached('index_adjacency', compute)
+    
+    def _betweenness_centrality(self, k: int = None, seed: int = 42) -> Dict[str, float]:
+        """
+        Betweenness centrality (алгоритм Брандеса) по компактной копии графа
+        
+        Результат совпадает с nx.betweenness_centrality(graph, k=k, seed=seed)
+        (нормированный, ориентированный). При заданном k обход идёт только из k
+        случайных источников: оценка несмещённая, погрешность порядка 1/√k.
+        """
+        names, succ = self._index_adjacency()
+        n = len(names)
+        betweenness = [0.0] * n
+        sources = range(n) if k is None else random.Random(seed).sample(range(n), k)
         
+        for source in sources:
+            # BFS: число кратчайших путей и предшественники на них
+            order = []
+            preds = [[] for _ in range(n)]
+            sigma = [0] * n
+            sigma[source] = 1
+            dist = [-1] * n
+            dist[source] = 0
+            queue = [source]
+            
+            for v in queue:
+                order.append(v)
+                next_dist = dist[v] + 1
+                sigma_v = sigma[v]
+                for w in succ[v]:
+                    if dist[w] < 0:
+                        dist[w] = next_dist
+                        queue.append(w)
+                    if dist[w] == next_dist:
+                        sigma[w] += sigma_v
+                        preds[w].append(v)
+            
+            # Накопление зависимостей в обратном порядке обхода
+            delta = [0.0] * n
+            for w in reversed(order):
+                coeff = (1 + delta[w]) / sigma[w]
+                for v in preds[w]:
+                    delta[v] += sigma[v] * coeff
+                if w != source:
+                    betweenness[w] += delta[w]
+        
+        if n > 2:
+            scale = 1 / ((n - 1) * (n - 2))
+            if k is not None:
+                scale = scale * n / k
+            betweenness = [value * scale for value in betweenness]
+        
+        return dict(zip(names, betweenness))
+    
     def add_function(self, name: str, module: str, params: List[Tuple[str, str]] = None, 
                      description: str = '', code_lines: int = 0):
         """Добавить функцию в граф"""
+        # Имена и модули повторяются по всему графу - храним по одному экземпляру
+        name = sys.intern(name)
+        module = sys.intern(module)
+        self.get_function_id(name)
+        self.get_module_id(module)
         self.functions[name] = {
             'name': name,
             'module': module,
@@ -37,9 +307,65 @@ class DependencyGraphBuilder:
             lines=code_lines,
             description=description[:100]
         )
+        # Версию меняем после изменения графа: расчёт, начатый раньше, не попадёт в кэш
+        self._version += 1
+    
+    def add_functions(self, functions: Iterable[Tuple[str, str, List[Tuple[str, str]], str, int]]):
+        """Добавить функции пачкой: (name, module, params, description, code_lines)"""
+        nodes = []
+        
+        for name, module, params, description, code_lines in functions:
+            name = sys.intern(name)
+            module = sys.intern(module)
+            self.get_function_id(name)
+            self.get_module_id(module)
+            self.functions[name] = {
+                'name': name,
+                'module': module,
+                'params': params or [],
+                'description': description,
+                'code_lines': code_lines
+            }
+            nodes.append((name, {
+                'module': module,
+                'params': len(params) if params else 0,
+                'lines': code_lines,
+                'description': description[:100]
+            }))
+        
+        self.graph.add_nodes_from(nodes)
+        self._version += 1
+    
+    def add_calls(self, calls: Iterable[Tuple[str, str, int]]):
+        """Добавить вызовы пачкой: (caller, callee, line_number)"""
+        # Сначала сворачиваем повторы одного ребра: (caller, callee) -> номера строк
+        aggregated = defaultdict(list)
+        for caller, callee, line_number in calls:
+            aggregated[(sys.intern(caller), sys.intern(callee))].append(line_number)
+        
+        new_edges = []
+        for (caller, callee), lines in aggregated.items():
+            self.call_counts[(caller, callee)] += len(lines)
+            
+            if self.graph.has_edge(caller, callee):
+                data = self.graph[caller][callee]
+                data['weight'] += len(lines)
+                data['lines'].extend(lines)
+            else:
+                # Как в add_call: пустой номер строки не сохраняется только у нового ребра
+                new_edges.append((caller, callee, {
+                    'weight': len(lines),
+                    'lines': lines if lines[0] else lines[1:]
+                }))
+        
+        self.graph.add_edges_from(new_edges)
+        self._version += 1
     
     def add_call(self, caller: str, callee: str, line_number: int = None):
         """Добавить вызов функции"""
+        caller = sys.intern(caller)
+        callee = sys.intern(callee)
+        
         # Увеличиваем счётчик вызовов
         self.call_counts[(caller, callee)] += 1
         
@@ -52,6 +378,7 @@ class DependencyGraphBuilder:
                 weight=1,
                 lines=[line_number] if line_number else []
             )
+        self._version += 1
     
     def get_function_info(self, name: str) -> Dict:
         """Получить информацию о функции"""
@@ -75,6 +402,11 @@ class DependencyGraphBuilder:
         
         direction: 'both', 'forward' (кого вызывает), 'backward' (кто вызывает)
         """
+        return self._cached(('subgraph', func_name, depth, direction),
+                            lambda: self._build_subgraph(func_name, depth, direction))
+    
+    def _build_subgraph(self, func_name: str, depth: int, direction: str) -> nx.DiGraph:
+        """Построить подграф вокруг функции (без кэша)"""
         if func_name not in self.graph:
             return nx.DiGraph()
         
@@ -82,24 +414,34 @@ class DependencyGraphBuilder:
         
         # Forward - кого вызывает эта функция
         if direction in ('both', 'forward'):
-            for _ in range(depth):
-                new_nodes = set()
-                for node in nodes:
-                    new_nodes.update(self.graph.successors(node))
-                nodes.update(new_nodes)
+            self._expand(nodes, self.graph.successors, depth)
         
         # Backward - кто вызывает эту функцию
         if direction in ('both', 'backward'):
-            for _ in range(depth):
-                new_nodes = set()
-                for node in nodes:
-                    new_nodes.update(self.graph.predecessors(node))
-                nodes.update(new_nodes)
+            self._expand(nodes, self.graph.predecessors, depth)
         
         return self.graph.subgraph(nodes).copy()
     
+    @staticmethod
+    def _expand(nodes: Set[str], neighbors, depth: int):
+        """Добавить в nodes всё, что достижимо за depth шагов (BFS по фронту)"""
+        # Раскрываем только новые узлы каждого уровня - каждый узел обходится один раз
+        frontier = set(nodes)
+        for _ in range(depth):
+            new_nodes = set()
+            for node in frontier:
+                new_nodes.update(neighbors(node))
+            new_nodes -= nodes
+            if not new_nodes:
+                break
+            nodes |= new_nodes
+            frontier = new_nodes
+    
     def find_circular_dependencies(self) -> List[List[str]]:
         """Найти циклические зависимости"""
+        return self._cached('cycles', self._find_cycles)
+    
+    def _find_cycles(self) -> List[List[str]]:
         try:
             cycles = list(nx.simple_cycles(self.graph))
             return cycles
@@ -108,42 +450,69 @@ class DependencyGraphBuilder:
     
     def get_call_path(self, from_func: str, to_func: str) -> List[str]:
         """Найти путь вызовов между функциями"""
-        try:
-            if from_func in self.graph and to_func in self.graph:
-                return nx.shortest_path(self.graph, from_func, to_func)
+        if from_func not in self.graph or to_func not in self.graph:
+            return []
+        
+        # Между разными компонентами связности пути нет - неудачный поиск обошёл бы их целиком.
+        # Карта компонент дороже одного поиска, поэтому строится только после первой неудачи
+        components = self._peek_cached('components')
+        if components is not None and components[from_func] != components[to_func]:
             return []
+        
+        try:
+            return nx.shortest_path(self.graph, from_func, to_func)
         except nx.NetworkXNoPath:
+            self._component_ids()
             return []
     
     def get_most_called_functions(self, limit: int = 10) -> List[Tuple[str, int]]:
         """Самые часто вызываемые функции"""
-        in_degrees = dict(self.graph.in_degree())
-        sorted_funcs = sorted(in_degrees.items(), key=lambda x: -x[1])
-        return sorted_funcs[:limit]
+        def compute():
+            in_degrees, _ = self._degrees()
+            return heapq.nlargest(limit, in_degrees.items(), key=itemgetter(1))
+        return self._cached(('most_called', limit), compute)
     
     def get_most_calling_functions(self, limit: int = 10) -> List[Tuple[str, int]]:
         """Функции, которые вызывают больше всего других"""
-        out_degrees = dict(self.graph.out_degree())
-        sorted_funcs = sorted(out_degrees.items(), key=lambda x: -x[1])
-        return sorted_funcs[:limit]
+        def compute():
+            _, out_degrees = self._degrees()
+            return heapq.nlargest(limit, out_degrees.items(), key=itemgetter(1))
+        return self._cached(('most_calling', limit), compute)
+    
+    def get_top_call_edges(self, limit: int = 10) -> List[Tuple[Tuple[str, str], int]]:
+        """Самые частые вызовы: ((caller, callee), count)"""
+        return self.call_counts.most_common(limit)
     
     def get_central_functions(self, limit: int = 10) -> List[Tuple[str, float]]:
-        """Центральные функции (по betweenness centrality)"""
+        """
+        Центральные функции (по betweenness centrality)
+        
+        На графах больше CENTRALITY_EXACT_LIMIT узлов centrality оценивается по
+        CENTRALITY_SAMPLES источникам (погрешность ~1/√k) - порядок топа при этом
+        практически не меняется, а время падает пропорционально V/k.
+        """
         if len(self.graph) == 0:
             return []
         
-        centrality = nx.betweenness_centrality(self.graph)
-        sorted_funcs = sorted(centrality.items(), key=lambda x: -x[1])
-        return sorted_funcs[:limit]
+        def compute():
+            # Betweenness - O(V·E), пересчитываем только после изменения графа
+            k = self.CENTRALITY_SAMPLES if len(self.graph) > self.CENTRALITY_EXACT_LIMIT else None
+            centrality = self._cached(('betweenness', k), lambda: self._betweenness_centrality(k))
+            return heapq.nlargest(limit, centrality.items(), key=itemgetter(1))
+        return self._cached(('central', limit), compute)
     
     def get_isolated_functions(self) -> List[str]:
         """Изолированные функции (не вызывают и не вызываются)"""
+        in_degrees, out_degrees = self._degrees()
         isolated = [node for node in self.graph.nodes() 
-                   if self.graph.in_degree(node) == 0 and self.graph.out_degree(node) == 0]
+                   if in_degrees[node] == 0 and out_degrees[node] == 0]
         return isolated
     
     def get_stats(self) -> Dict:
         """Статистика графа"""
+        return self._cached('stats', self._compute_stats)
+    
+    def _compute_stats(self) -> Dict:
         stats = {
             'total_functions': len(self.graph.nodes()),
             'total_calls': len(self.graph.edges()),
@@ -154,38 +523,31 @@ class DependencyGraphBuilder:
             'isolated_functions': len(self.get_isolated_functions())
         }
         
-        # Группируем по модулям
-        by_module = defaultdict(int)
-        for node, data in self.graph.nodes(data=True):
-            by_module[data.get('module', 'unknown')] += 1
+        # Группируем по модулям (Counter считает на C)
+        by_module = Counter(data.get('module', 'unknown') for _, data in self.graph.nodes(data=True))
         stats['by_module'] = dict(by_module)
         
         return stats
     
     def export_to_json(self, filename: str):
         """Экспорт в JSON"""
-        # Конвертируем граф в JSON-совместимый формат
-        nodes = []
-        for node, data in self.graph.nodes(data=True):
-            node_info = {
-                'id': node,
-                'module': data.get('module', ''),
-                'params': data.get('params', 0),
-                'lines': data.get('lines', 0),
-                'in_degree': self.graph.in_degree(node),
-                'out_degree': self.graph.out_degree(node)
-            }
-            nodes.append(node_info)
-        
-        edges = []
-        for u, v, data in self.graph.edges(data=True):
-            edge_info = {
-                'from': u,
-                'to': v,
-                'weight': data.get('weight', 1),
-                'lines': data.get('lines', [])
-            }
-            edges.append(edge_info)
+        # Конвертируем граф в JSON-совместимый формат (степени берём из готовых словарей)
+        in_degrees, out_degrees = self._degrees()
+        nodes = [{
+            'id': node,
+            'module': data.get('module', ''),
+            'params': data.get('params', 0),
+            'lines': data.get('lines', 0),
+            'in_degree': in_degrees[node],
+            'out_degree': out_degrees[node]
+        } for node, data in self.graph.nodes(data=True)]
+        
+        edges = [{
+            'from': u,
+            'to': v,
+            'weight': data.get('weight', 1),
+            'lines': data.get('lines', [])
+        } for u, v, data in self.graph.edges(data=True)]
         
         graph_data = {
             'stats': self.get_stats(),
@@ -210,135 +572,45 @@ class DependencyGraphBuilder:
             subgraph = self.graph
         
         # Готовим данные для vis.js
-        nodes_data = []
-        for node, data in subgraph.nodes(data=True):
-            color = self._get_node_color(data.get('module', ''))
-            
-            nodes_data.append({
-                'id': node,
-                'label': node,
-                'title': f"{node}\nМодуль: {data.get('module', 'unknown')}\nПараметров: {data.get('params', 0)}",
-                'color': color,
-                'size': 20 + data.get('lines', 0) / 10
-            })
-        
-        edges_data = []
-        for u, v, data in subgraph.edges(data=True):
-            edges_data.append({
-                'from': u,
-                'to': v,
-                'value': data.get('weight', 1),
-                'title': f"Вызовов: {data.get('weight', 1)}"
-            })
-        
-        html_template = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="utf-8">
-    <title>Fansy Dependency Graph{' - ' + focus_func if focus_func else ''}</title>
-    <script src="https://unpkg.com/vis-network/standalone/umd/vis-network.min.js"></script>
-    <style>
-        body {{
-            font-family: Arial, sans-serif;
-            margin: 0;
-            padding: 20px;
-        }}
-        #mynetwork {{
-            width: 100%;
-            height: 800px;
-            border: 1px solid lightgray;
-        }}
-        .info {{
-            margin-bottom: 20px;
-            padding: 10px;
-            background: #f0f0f0;
-            border-radius: 5px;
-        }}
-        h1 {{
-            margin: 0 0 10px 0;
-        }}
-    </style>
-</head>
-<body>
-    <div class="info">
-        <h1>Граф зависимостей функций Fansy</h1>
-        {f'<p><strong>Фокус на функции:</strong> {focus_func}</p>' if focus_func else ''}
-        <p><strong>Функций:</strong> {len(nodes_data)} | <strong>Связей:</strong> {len(edges_data)}</p>
-    </div>
-    
-    <div id="mynetwork"></div>
-    
-    <script type="text/javascript">
-        var nodes = new vis.DataSet({json.dumps(nodes_data)});
-        var edges = new vis.DataSet({json.dumps(edges_data)});
-        
-        var container = document.getElementById('mynetwork');
-        var data = {{
-            nodes: nodes,
-            edges: edges
-        }};
-        var options = {{
-            nodes: {{
-                shape: 'dot',
-                font: {{
-                    size: 14
-                }}
-            }},
-            edges: {{
-                arrows: 'to',
-                smooth: {{
-                    type: 'cubicBezier'
-                }}
-            }},
-            physics: {{
-                stabilization: {{
-                    iterations: 200
-                }},
-                barnesHut: {{
-                    gravitationalConstant: -8000,
-                    springConstant: 0.04,
-                    springLength: 150
-                }}
-            }},
-            interaction: {{
-                hover: true,
-                tooltipDelay: 100
-            }}
-        }};
+        colors = self.MODULE_COLORS
+        default_color = self.DEFAULT_NODE_COLOR
+        nodes_data = [{
+            'id': node,
+            'label': node,
+            'title': f"{node}\nМодуль: {data.get('module', 'unknown')}\nПараметров: {data.get('params', 0)}",
+            'color': colors.get(data.get('module', ''), default_color),
+            'size': 20 + data.get('lines', 0) / 10
+        } for node, data in subgraph.nodes(data=True)]
         
-        var network = new vis.Network(container, data, options);
+        edges_data = [{
+            'from': u,
+            'to': v,
+            'value': data.get('weight', 1),
+            'title': f"Вызовов: {data.get('weight', 1)}"
+        } for u, v, data in subgraph.edges(data=True)]
         
-        // Клик по узлу - показываем детали
-        network.on("click", function (params) {{
-            if (params.nodes.length > 0) {{
-                var nodeId = params.nodes[0];
-                alert('Функция: ' + nodeId + '\\n\\nДля подробностей смотрите консоль');
-                console.log('Node clicked:', nodeId, nodes.get(nodeId));
-            }}
-        }});
-    </script>
-</body>
-</html>
-"""
+        # Данные пишем в файл кусками между статическими частями шаблона
+        head = _HTML_HEAD.format(
+            title_suffix=' - ' + focus_func if focus_func else '',
+            focus_info=f'<p><strong>Фокус на функции:</strong> {focus_func}</p>' if focus_func else '',
+            nodes_count=len(nodes_data),
+            edges_count=len(edges_data)
+        )
         
         with open(filename, 'w', encoding='utf-8') as f:
-            f.write(html_template)
+            f.write(head)
+            f.write('        var nodes = new vis.DataSet(')
+            f.write(_dumps(nodes_data))
+            f.write(');\n        var edges = new vis.DataSet(')
+            f.write(_dumps(edges_data))
+            f.write(');\n')
+            f.write(_HTML_TAIL)
         
         print(f"✅ Интерактивный HTML создан: {filename}")
     
     def _get_node_color(self, module: str) -> str:
         """Цвет узла по модулю"""
-        colors = {
-            '_F_SPECTRE': '#FF6B6B',
-            '_F_BUX': '#4ECDC4',
-            '_F_DOC': '#45B7D1',
-            '_F_PIF': '#FFA07A',
-            '_F_ECO': '#98D8C8',
-            '_METAL_F': '#C7CEEA',
-            '_F_REPORT': '#FFDAB9'
-        }
-        return colors.get(module, '#95E1D3')
+        return self.MODULE_COLORS.get(module, self.DEFAULT_NODE_COLOR)
 
 
 def example_usage():
@@ -4,13 +4,26 @@ Fansy Analytics Web Server
 Flask приложение с REST API и Server-Sent Events
 """
 
-from flask import Flask, jsonify, request, render_template_string, Response
+from flask import Flask, request, Response
 from flask_cors import CORS
+from werkzeug.datastructures import MultiDict
 import json
 import time
 import threading
-from datetime import datetime
+import itertools
+import zlib
+import gzip
+import heapq
 from collections import deque
+from functools import lru_cache, wraps
+from operator import itemgetter
+from urllib.parse import parse_qsl
+
+# orjson (если установлен) кодирует JSON на C и сразу отдаёт bytes
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Импортируем наши модули
 import sys
@@ -26,107 +39,291 @@ CORS(app)  # Разрешаем CORS для разработки
 # Глобальные объекты
 function_logger = get_logger()
 graph_builder = DependencyGraphBuilder()
-event_stream = deque(maxlen=100)  # События для SSE
+event_stream = deque(maxlen=100)  # (seq, SSE-кадр) последних событий - окно для повторной отправки
+_event_seq = itertools.count(1)  # Номер события = SSE id, браузер вернёт его в Last-Event-ID
+
+# SSE-клиенты ждут на условии, а не опрашивают стрим раз в секунду:
+# add_event раскладывает событие в очереди подписчиков и будит их
+_event_cv = threading.Condition()
+_subscribers = []  # очереди событий подключённых SSE-клиентов
+SUBSCRIBER_QUEUE_SIZE = 1024  # медленный клиент теряет старые события, а не копит память
+HEARTBEAT_INTERVAL = 30  # секунд между heartbeat (держит соединение и выявляет отключившихся)
+_HEARTBEAT = b": heartbeat\n\n"
+# Первый кадр потока: Werkzeug шлёт заголовки только с первыми байтами, без него
+# onopen в браузере ждал бы первого события или heartbeat (до HEARTBEAT_INTERVAL)
+_STREAM_START = b"retry: 3000\n\n"
+
+# Готовые ответы часто опрашиваемых эндпоинтов: key -> (истекает, тело, Content-Type)
+_response_cache = {}
+_response_cache_lock = threading.Lock()
+RESPONSE_CACHE_TTL = 0.5  # секунд - меньше, чем период опроса дашборда
+
+
+def ttl_cache(seconds: float):
+    """Кэшировать тело ответа эндпоинта на seconds секунд (по аргументам пути и запроса)"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Сырая строка запроса в ключе: попадание в кэш не разбирает request.args
+            key = (view.__name__, tuple(sorted(kwargs.items())), request.query_string)
+            now = time.monotonic()
+            
+            with _response_cache_lock:
+                cached = _response_cache.get(key)
+            if cached and cached[0] > now:
+                return app.response_class(cached[1], content_type=cached[2])
+            
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                with _response_cache_lock:
+                    # Просроченные ответы выбрасываем здесь: иначе ключи разных строк запроса
+                    # копились бы до следующего события
+                    expired = [k for k, (expires, _, _) in _response_cache.items() if expires <= now]
+                    for k in expired:
+                        del _response_cache[k]
+                    _response_cache[key] = (now + seconds, response.get_data(), response.content_type)
+            return response
+        return wrapper
+    return decorator
+
+
+@lru_cache(maxsize=256)
+def _parse_query_arg(query_string: bytes, name: str, default, type):
+    """Разобрать параметр из самой строки запроса, без request: ключ кэша - все входные данные"""
+    args = MultiDict(parse_qsl(query_string.decode('utf-8', 'replace'), keep_blank_values=True))
+    return args.get(name, default, type=type)
+
+
+def query_arg(name: str, default=None, type=None):
+    """Аналог request.args.get с кэшем разбора по строке запроса"""
+    return _parse_query_arg(request.query_string, name, default, type)
+
+
+def invalidate_response_cache():
+    """Сбросить закэшированные ответы (данные изменились)"""
+    with _response_cache_lock:
+        _response_cache.clear()
 
 
 # ============================================================================
 # Server-Sent Events (Real-time updates)
 # ============================================================================
 
+def _json_default(obj):
+    """Значения вне JSON (date, datetime, Decimal из данных логгера) - строкой, а не ошибкой 500"""
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    return str(obj)
+
+
+def _dumps(obj) -> bytes:
+    """Сериализовать объект в компактный JSON (UTF-8)"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, default=_json_default).encode('utf-8')
+
+
 def add_event(event_type: str, data: dict):
     """Добавить событие в стрим"""
+    # Имена модуля и функции уходят номерами: словарь клиент берёт из /api/graph/dictionary
+    if 'module' in data and 'function' in data:
+        data = dict(data)
+        data['m'] = graph_builder.get_module_id(data.pop('module'))
+        data['f'] = graph_builder.get_function_id(data.pop('function'))
+    
     event = {
         'type': event_type,
         'data': data,
-        'timestamp': datetime.now().isoformat()
+        'ts': time.time_ns()  # время события в нс; в браузере - new Date(ts / 1e6)
     }
-    event_stream.append(event)
+    # Сериализуем один раз - всем клиентам уходит одна и та же строка
+    payload = _dumps(event)
+    
+    with _event_cv:
+        # Номер берём под блокировкой, чтобы порядок в стриме совпадал с нумерацией
+        seq = next(_event_seq)
+        frame = b"id: %d\ndata: %s\n\n" % (seq, payload)
+        event_stream.append((seq, frame))
+        for queue in _subscribers:
+            queue.append(frame)
+        _event_cv.notify_all()
+    
+    # Вызов начался или закончился - статистика и активные вызовы устарели
+    invalidate_response_cache()
+
+
+def _send_heartbeat():
+    """Положить heartbeat в очередь каждого подписчика"""
+    with _event_cv:
+        for queue in _subscribers:
+            queue.append(_HEARTBEAT)
+        _event_cv.notify_all()
+
+
+def _heartbeat_loop():
+    """Один поток на всех SSE-клиентов: heartbeat раз в HEARTBEAT_INTERVAL"""
+    while True:
+        time.sleep(HEARTBEAT_INTERVAL)
+        _send_heartbeat()
+
+
+threading.Thread(target=_heartbeat_loop, name='sse-heartbeat', daemon=True).start()
+
+
+def get_last_event_id() -> int:
+    """Номер последнего опубликованного события (0, если событий ещё не было)"""
+    with _event_cv:
+        return event_stream[-1][0] if event_stream else 0
+
+
+def _gzip_stream(chunks):
+    """Сжимать поток на лету: каждый кусок сразу дожимается до клиента (Z_SYNC_FLUSH)"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 - формат gzip
+    try:
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    finally:
+        chunks.close()
 
 
 @app.route('/api/events')
 def events():
     """SSE endpoint для real-time обновлений"""
+    # При переподключении браузер присылает номер последнего полученного события
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id is None:
+        # Первое подключение дашборда: номер последнего события, учтённого в снимке
+        last_event_id = query_arg('last_event_id', type=int)
+    
     def generate():
-        last_index = 0
-        while True:
-            # Отправляем новые события
-            if len(event_stream) > last_index:
-                for i in range(last_index, len(event_stream)):
-                    event = event_stream[i]
-                    yield f"data: {json.dumps(event)}\n\n"
-                last_index = len(event_stream)
+        # Новый клиент сначала получает накопленные события (после переподключения - только пропущенные)
+        with _event_cv:
+            missed = [frame for seq, frame in event_stream if last_event_id is None or seq > last_event_id]
+            queue = deque(missed, maxlen=SUBSCRIBER_QUEUE_SIZE)
+            _subscribers.append(queue)
+        
+        try:
+            yield _STREAM_START
             
-            # Heartbeat каждые 30 секунд
-            yield f": heartbeat\n\n"
-            time.sleep(1)
+            while True:
+                # Таймаут не нужен: heartbeat кладёт в очередь общий поток _heartbeat_loop
+                with _event_cv:
+                    while not queue:
+                        _event_cv.wait()
+                    pending = list(queue)
+                    queue.clear()
+                
+                # Отправляем новые события пачкой - одна запись в сокет на всё накопленное
+                yield b''.join(pending)
+        finally:
+            # Клиент отключился - перестаём складывать ему события
+            with _event_cv:
+                _subscribers.remove(queue)
     
-    return Response(generate(), mimetype='text/event-stream')
+    # X-Accel-Buffering: nginx не копит поток у себя, события уходят сразу
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'Vary': 'Accept-Encoding'}
+    stream = generate()
+    
+    # JSON событий с повторяющимися ключами хорошо сжимается
+    if request.accept_encodings['gzip']:  # учитывает q-значения (gzip;q=0 - отказ)
+        headers['Content-Encoding'] = 'gzip'
+        stream = _gzip_stream(stream)
+    
+    return Response(stream, mimetype='text/event-stream', headers=headers)
+
+
+# ============================================================================
+# JSON-ответы (вместо jsonify: кириллица без \uXXXX, orjson, если установлен)
+# ============================================================================
+
+def _json_response(payload: dict, status: int = 200) -> Response:
+    """JSON-ответ из словаря"""
+    return app.response_class(_dumps(payload), status=status, mimetype='application/json')
+
+
+def _ok(data, **extra) -> Response:
+    """Успешный ответ: {'success': True, 'data': data, ...extra}"""
+    return _json_response({'success': True, 'data': data, **extra})
+
+
+def _error(message: str, status: int) -> Response:
+    """Ответ с ошибкой: {'success': False, 'error': message}"""
+    return _json_response({'success': False, 'error': message}, status)
 
 
 # ============================================================================
 # REST API - Function Calls
 # ============================================================================
 
+TOP_FUNCTIONS_LIMIT = 10  # столько функций показывает график дашборда
+
+
+def _call_stats() -> dict:
+    """Статистика логгера, в которой by_function - только топ функций: [[имя, вызовов], ...]"""
+    stats = dict(function_logger.get_stats())
+    stats['by_function'] = heapq.nlargest(TOP_FUNCTIONS_LIMIT, stats['by_function'].items(), key=itemgetter(1))
+    return stats
+
+
 @app.route('/api/function-calls/history')
 def get_call_history():
     """История вызовов функций"""
-    limit = request.args.get('limit', 100, type=int)
-    module = request.args.get('module', None)
-    function = request.args.get('function', None)
+    limit = query_arg('limit', 100, type=int)
+    module = query_arg('module', None)
+    function = query_arg('function', None)
     
     history = function_logger.get_history(limit, module, function)
-    return jsonify({
-        'success': True,
-        'data': history,
-        'count': len(history)
-    })
+    return _ok(history, count=len(history))
 
 
 @app.route('/api/function-calls/active')
+@ttl_cache(RESPONSE_CACHE_TTL)
 def get_active_calls():
     """Активные вызовы"""
     active = function_logger.get_active_calls()
-    return jsonify({
-        'success': True,
-        'data': active,
-        'count': len(active)
-    })
+    return _ok(active, count=len(active))
 
 
 @app.route('/api/function-calls/stats')
+@ttl_cache(RESPONSE_CACHE_TTL)
 def get_call_stats():
     """Статистика вызовов"""
-    stats = function_logger.get_stats()
-    return jsonify({
-        'success': True,
-        'data': stats
-    })
+    return _ok(_call_stats())
 
 
 @app.route('/api/function-calls/slow')
 def get_slow_calls():
     """Медленные вызовы"""
-    threshold = request.args.get('threshold', 1.0, type=float)
-    limit = request.args.get('limit', 10, type=int)
+    threshold = query_arg('threshold', 1.0, type=float)
+    limit = query_arg('limit', 10, type=int)
     
     slow = function_logger.get_slow_calls(threshold, limit)
-    return jsonify({
-        'success': True,
-        'data': slow,
-        'count': len(slow)
+    return _ok(slow, count=len(slow))
+
+
+@app.route('/api/dashboard/snapshot')
+@ttl_cache(RESPONSE_CACHE_TTL)
+def get_dashboard_snapshot():
+    """Всё, что показывает дашборд, одним запросом: статистика, активные вызовы, история"""
+    limit = query_arg('limit', 20, type=int)
+    # Номер события берём до снимка: события после него клиент дочитает из SSE
+    last_event_id = get_last_event_id()
+    
+    return _ok({
+        'last_event_id': last_event_id,
+        'stats': _call_stats(),
+        'active': function_logger.get_active_calls(),
+        'history': function_logger.get_history(limit)
     })
 
 
 @app.route('/api/function-calls/tree')
 def get_call_tree():
     """Дерево вызовов"""
-    root_id = request.args.get('root_id', None, type=int)
+    root_id = query_arg('root_id', None, type=int)
     
     tree = function_logger.get_call_tree(root_id)
-    return jsonify({
-        'success': True,
-        'data': tree
-    })
+    return _ok(tree)
 
 
 # ============================================================================
@@ -134,13 +331,17 @@ def get_call_tree():
 # ============================================================================
 
 @app.route('/api/graph/stats')
+@ttl_cache(RESPONSE_CACHE_TTL)
 def get_graph_stats():
     """Статистика графа"""
     stats = graph_builder.get_stats()
-    return jsonify({
-        'success': True,
-        'data': stats
-    })
+    return _ok(stats)
+
+
+@app.route('/api/graph/dictionary')
+def get_graph_dictionary():
+    """Номера модулей и функций, которыми события SSE заменяют имена"""
+    return _ok(graph_builder.get_dictionary())
 
 
 @app.route('/api/graph/function/<func_name>')
@@ -148,44 +349,39 @@ def get_function_info(func_name):
     """Информация о функции"""
     info = graph_builder.get_function_info(func_name)
     if info:
-        return jsonify({
-            'success': True,
-            'data': info
-        })
+        return _ok(info)
     else:
-        return jsonify({
-            'success': False,
-            'error': f"Функция '{func_name}' не найдена"
-        }), 404
+        return _error(f"Функция '{func_name}' не найдена", 404)
 
 
 @app.route('/api/graph/subgraph/<func_name>')
 def get_subgraph(func_name):
     """Подграф вокруг функции"""
-    depth = request.args.get('depth', 2, type=int)
-    direction = request.args.get('direction', 'both')
+    depth = query_arg('depth', 2, type=int)
+    direction = query_arg('direction', 'both')
     
+    # Версия графа в ключе: после изменения графа старые ответы просто перестают совпадать
+    body = _subgraph_json(graph_builder.version, func_name, depth, direction)
+    return app.response_class(body, mimetype='application/json')
+
+
+@lru_cache(maxsize=256)
+def _subgraph_json(version: int, func_name: str, depth: int, direction: str) -> bytes:
+    """Готовый JSON-ответ с подграфом для данной версии графа"""
     subgraph = graph_builder.get_subgraph(func_name, depth, direction)
     
     # Конвертируем в JSON
-    nodes = []
-    for node, data in subgraph.nodes(data=True):
-        nodes.append({
-            'id': node,
-            'module': data.get('module', ''),
-            'params': data.get('params', 0),
-            'lines': data.get('lines', 0)
-        })
-    
-    edges = []
-    for u, v, data in subgraph.edges(data=True):
-        edges.append({
-            'from': u,
-            'to': v,
-            'weight': data.get('weight', 1)
-        })
-    
-    return jsonify({
+    nodes = [
+        {'id': node, 'module': data.get('module', ''), 'params': data.get('params', 0), 'lines': data.get('lines', 0)}
+        for node, data in subgraph.nodes(data=True)
+    ]
+    edges = [
+        {'from': u, 'to': v, 'weight': data.get('weight', 1)}
+        for u, v, data in subgraph.edges(data=True)
+    ]
+    
+    # Подграф может быть большим - кодируем один раз, ответ берётся из кэша
+    return _dumps({
         'success': True,
         'data': {
             'nodes': nodes,
@@ -197,32 +393,21 @@ def get_subgraph(func_name):
 @app.route('/api/graph/path')
 def get_call_path():
     """Путь между функциями"""
-    from_func = request.args.get('from')
-    to_func = request.args.get('to')
+    from_func = query_arg('from')
+    to_func = query_arg('to')
     
     if not from_func or not to_func:
-        return jsonify({
-            'success': False,
-            'error': 'Параметры from и to обязательны'
-        }), 400
+        return _error('Параметры from и to обязательны', 400)
     
     path = graph_builder.get_call_path(from_func, to_func)
-    return jsonify({
-        'success': True,
-        'data': path,
-        'length': len(path)
-    })
+    return _ok(path, length=len(path))
 
 
 @app.route('/api/graph/circular')
 def get_circular_deps():
     """Циклические зависимости"""
     cycles = graph_builder.find_circular_dependencies()
-    return jsonify({
-        'success': True,
-        'data': cycles,
-        'count': len(cycles)
-    })
+    return _ok(cycles, count=len(cycles))
 
 
 # ============================================================================
@@ -237,9 +422,16 @@ def simulate_call():
     module = data.get('module', '_F_TEST')
     function = data.get('function', 'test_func')
     params = data.get('params', {})
-    duration = data.get('duration', 0.1)
     error = data.get('error', None)
     
+    # duration уходит в таймер: null или строка повесили бы или уронили его уже после ответа 200
+    try:
+        duration = float(data.get('duration', 0.1))
+    except (TypeError, ValueError):
+        return _error('duration должен быть числом секунд', 400)
+    if not 0 <= duration < float('inf'):  # NaN тоже не проходит
+        return _error('duration должен быть неотрицательным конечным числом', 400)
+    
     # Начинаем вызов
     call_id = function_logger.start_call(module, function, params)
     
@@ -251,10 +443,19 @@ def simulate_call():
         'params': params
     })
     
-    # Симулируем работу
-    time.sleep(duration)
+    # Симулируем работу: вызов завершится по таймеру, поток запроса не ждёт
+    timer = threading.Timer(duration, _finish_simulated_call, args=(call_id, module, function, duration, error))
+    timer.daemon = True
+    timer.start()
     
-    # Завершаем
+    return _json_response({
+        'success': True,
+        'call_id': call_id
+    })
+
+
+def _finish_simulated_call(call_id, module: str, function: str, duration: float, error):
+    """Завершить симулированный вызов (выполняется в потоке таймера)"""
     result = f"Result from {module}.{function}" if not error else None
     function_logger.end_call(call_id, result=result, error=error)
     
@@ -266,11 +467,6 @@ def simulate_call():
         'duration': duration,
         'error': error
     })
-    
-    return jsonify({
-        'success': True,
-        'call_id': call_id
-    })
 
 
 # ============================================================================
@@ -456,10 +652,27 @@ DASHBOARD_HTML = """
     <script>
         let modulesChart, functionsChart;
         let eventSource;
+        let statsTimer = null;
+        let eventQueue = Promise.resolve();
+        
+        // Номер -> имя для событий SSE, где модуль и функция переданы номерами (m, f)
+        const names = { modules: {}, functions: {} };
         
-        // Подключение к SSE
-        function connectSSE() {
-            eventSource = new EventSource('/api/events');
+        // Элементы списков по call_id: события SSE добавляют и убирают по одному элементу
+        const HISTORY_LIMIT = 20;
+        const activeItems = new Map();
+        const historyItems = new Map();  // порядок вставки = от старых к новым
+        const MODULE_COLORS = Object.freeze({
+            '_F_SPECTRE': '#FF6B6B',
+            '_F_BUX': '#4ECDC4',
+            '_F_DOC': '#45B7D1'
+        });
+        const NO_ACTIVE_CALLS = '<p style="color: #999; text-align: center; padding: 20px;">Нет активных вызовов</p>';
+        
+        // Подключение к SSE (lastEventId - событие, на котором снят начальный снимок)
+        function connectSSE(lastEventId) {
+            const url = lastEventId === undefined ? '/api/events' : `/api/events?last_event_id=${lastEventId}`;
+            eventSource = new EventSource(url);
             
             eventSource.onopen = () => {
                 document.getElementById('connection-status').innerHTML = '🟢 Подключено';
@@ -474,53 +687,108 @@ DASHBOARD_HTML = """
                 
                 try {
                     const data = JSON.parse(event.data);
-                    handleEvent(data);
+                    // Строго по порядку: событие может ждать догрузки словаря
+                    eventQueue = eventQueue.then(() => handleEvent(data))
+                        .catch(e => console.error('Error handling event:', e));
                 } catch (e) {
                     console.error('Error parsing event:', e);
                 }
             };
         }
         
-        function handleEvent(event) {
+        async function loadDictionary() {
+            try {
+                const response = await fetch('/api/graph/dictionary');
+                const data = await response.json();
+                
+                if (data.success) {
+                    for (const [name, id] of Object.entries(data.data.modules)) names.modules[id] = name;
+                    for (const [name, id] of Object.entries(data.data.functions)) names.functions[id] = name;
+                }
+            } catch (e) {
+                console.error('Error loading dictionary:', e);
+            }
+        }
+        
+        // Вернуть имена модуля и функции на место номеров; новые номера - догрузить словарь
+        async function resolveNames(data) {
+            if (data.m === undefined) return data;
+            
+            if (!(data.m in names.modules) || !(data.f in names.functions)) {
+                await loadDictionary();
+            }
+            return { ...data, module: names.modules[data.m], function: names.functions[data.f] };
+        }
+        
+        async function handleEvent(event) {
             console.log('Event:', event);
             
             if (event.type === 'function_call_start') {
-                // Обновляем активные вызовы
-                updateActiveCalls();
+                const call = await resolveNames(event.data);
+                addActiveCall({ ...call, start_time: event.ts / 1e6 });
+                scheduleStatsUpdate();
             } else if (event.type === 'function_call_end') {
-                // Обновляем историю и статистику
-                updateActiveCalls();
-                updateCallHistory();
-                updateStats();
+                const call = await resolveNames(event.data);
+                removeActiveCall(call.call_id);
+                addHistoryCall({
+                    ...call,
+                    status: call.error ? 'ERROR' : 'SUCCESS',
+                    start_time: event.ts / 1e6 - call.duration * 1000
+                });
+                scheduleStatsUpdate();
             }
         }
         
-        // Обновление статистики
-        async function updateStats() {
+        // Начальное состояние дашборда одним снимком; возвращает номер последнего учтённого события
+        async function updateAll() {
             try {
-                const response = await fetch('/api/function-calls/stats');
+                const response = await fetch(`/api/dashboard/snapshot?limit=${HISTORY_LIMIT}`);
                 const data = await response.json();
                 
                 if (data.success) {
-                    const stats = data.data;
-                    document.getElementById('total-calls').textContent = stats.total_calls;
-                    document.getElementById('avg-time').textContent = 
-                        (stats.avg_time * 1000).toFixed(0) + 'ms';
-                    document.getElementById('active-calls').textContent = stats.active_calls;
-                    
-                    // Обновляем графики
-                    updateCharts(stats);
+                    updateStats(data.data.stats);
+                    updateActiveCalls(data.data.active);
+                    updateCallHistory(data.data.history);
+                    return data.data.last_event_id;
                 }
             } catch (e) {
-                console.error('Error updating stats:', e);
+                console.error('Error updating dashboard:', e);
             }
         }
         
+        // Статистику перезапрашиваем не чаще раза в 300мс, сколько бы событий ни пришло
+        function scheduleStatsUpdate() {
+            if (statsTimer) return;
+            
+            statsTimer = setTimeout(async () => {
+                statsTimer = null;
+                try {
+                    const response = await fetch('/api/function-calls/stats');
+                    const data = await response.json();
+                    if (data.success) updateStats(data.data);
+                } catch (e) {
+                    console.error('Error updating stats:', e);
+                }
+            }, 300);
+        }
+        
+        // Обновление статистики
+        function updateStats(stats) {
+            document.getElementById('total-calls').textContent = stats.total_calls;
+            document.getElementById('avg-time').textContent = 
+                (stats.avg_time * 1000).toFixed(0) + 'ms';
+            document.getElementById('active-calls').textContent = stats.active_calls;
+            
+            // Обновляем графики
+            updateCharts(stats);
+        }
+        
         // Обновление графиков
         function updateCharts(stats) {
-            // Модули
-            const moduleLabels = Object.keys(stats.by_module);
-            const moduleData = Object.values(stats.by_module);
+            // Модули (пары [имя, счётчик] - один обход объекта)
+            const moduleEntries = Object.entries(stats.by_module);
+            const moduleLabels = moduleEntries.map(e => e[0]);
+            const moduleData = moduleEntries.map(e => e[1]);
             
             if (modulesChart) {
                 modulesChart.data.labels = moduleLabels;
@@ -528,9 +796,9 @@ DASHBOARD_HTML = """
                 modulesChart.update();
             }
             
-            // Функции
-            const funcLabels = Object.keys(stats.by_function).slice(0, 10);
-            const funcData = Object.values(stats.by_function).slice(0, 10);
+            // Функции: сервер присылает готовый топ [[имя, вызовов], ...] по убыванию
+            const funcLabels = stats.by_function.map(e => e[0]);
+            const funcData = stats.by_function.map(e => e[1]);
             
             if (functionsChart) {
                 functionsChart.data.labels = funcLabels;
@@ -539,62 +807,86 @@ DASHBOARD_HTML = """
             }
         }
         
-        // Обновление активных вызовов
-        async function updateActiveCalls() {
-            try {
-                const response = await fetch('/api/function-calls/active');
-                const data = await response.json();
-                
-                const container = document.getElementById('active-calls-list');
-                
-                if (data.data.length === 0) {
-                    container.innerHTML = '<p style="color: #999; text-align: center; padding: 20px;">Нет активных вызовов</p>';
-                    return;
-                }
-                
-                container.innerHTML = data.data.map(call => `
-                    <div class="call-item">
-                        <div class="call-header">
-                            <span class="status-indicator status-running"></span>
-                            ${call.module}->${call.function}()
-                        </div>
-                        <div class="call-details">
-                            Глубина: ${call.depth} | Начало: ${new Date(call.start_time).toLocaleTimeString()}
-                        </div>
+        function createCallItem(html) {
+            const template = document.createElement('template');
+            template.innerHTML = html.trim();
+            return template.content.firstChild;
+        }
+        
+        // Активные вызовы: полная отрисовка по снимку, дальше - по событиям
+        function updateActiveCalls(active) {
+            activeItems.clear();
+            document.getElementById('active-calls-list').innerHTML = NO_ACTIVE_CALLS;
+            active.forEach(addActiveCall);
+        }
+        
+        function addActiveCall(call) {
+            if (activeItems.has(call.call_id)) return;
+            
+            const container = document.getElementById('active-calls-list');
+            if (activeItems.size === 0) container.innerHTML = '';
+            
+            // В событии SSE глубины нет - её знает только логгер
+            const depth = call.depth === undefined ? '' : `Глубина: ${call.depth} | `;
+            const item = createCallItem(`
+                <div class="call-item">
+                    <div class="call-header">
+                        <span class="status-indicator status-running"></span>
+                        ${call.module}->${call.function}()
                     </div>
-                `).join('');
-            } catch (e) {
-                console.error('Error updating active calls:', e);
+                    <div class="call-details">
+                        ${depth}Начало: ${new Date(call.start_time).toLocaleTimeString()}
+                    </div>
+                </div>
+            `);
+            activeItems.set(call.call_id, item);
+            container.prepend(item);
+        }
+        
+        function removeActiveCall(callId) {
+            const item = activeItems.get(callId);
+            if (!item) return;
+            
+            item.remove();
+            activeItems.delete(callId);
+            if (activeItems.size === 0) {
+                document.getElementById('active-calls-list').innerHTML = NO_ACTIVE_CALLS;
             }
         }
         
-        // Обновление истории
-        async function updateCallHistory() {
-            try {
-                const response = await fetch('/api/function-calls/history?limit=20');
-                const data = await response.json();
-                
-                const container = document.getElementById('call-history');
-                container.innerHTML = data.data.reverse().map(call => {
-                    const statusClass = call.status === 'ERROR' ? 'error' : '';
-                    const statusIcon = call.status === 'SUCCESS' ? '✅' : '❌';
-                    
-                    return `
-                        <div class="call-item ${statusClass}">
-                            <div class="call-header">
-                                <span class="status-indicator status-${call.status.toLowerCase()}"></span>
-                                ${statusIcon} ${call.module}->${call.function}()
-                            </div>
-                            <div class="call-details">
-                                Время: ${(call.duration * 1000).toFixed(2)}ms | 
-                                ${new Date(call.start_time).toLocaleTimeString()}
-                                ${call.error ? `<br>❌ ${call.error}` : ''}
-                            </div>
-                        </div>
-                    `;
-                }).join('');
-            } catch (e) {
-                console.error('Error updating history:', e);
+        // История: снимок приходит от старых к новым, новые вызовы - сверху
+        function updateCallHistory(history) {
+            historyItems.clear();
+            document.getElementById('call-history').innerHTML = '';
+            history.forEach(addHistoryCall);
+        }
+        
+        function addHistoryCall(call) {
+            if (historyItems.has(call.call_id)) return;
+            
+            const statusClass = call.status === 'ERROR' ? 'error' : '';
+            const statusIcon = call.status === 'SUCCESS' ? '✅' : '❌';
+            const item = createCallItem(`
+                <div class="call-item ${statusClass}">
+                    <div class="call-header">
+                        <span class="status-indicator status-${call.status.toLowerCase()}"></span>
+                        ${statusIcon} ${call.module}->${call.function}()
+                    </div>
+                    <div class="call-details">
+                        Время: ${(call.duration * 1000).toFixed(2)}ms | 
+                        ${new Date(call.start_time).toLocaleTimeString()}
+                        ${call.error ? `<br>❌ ${call.error}` : ''}
+                    </div>
+                </div>
+            `);
+            historyItems.set(call.call_id, item);
+            document.getElementById('call-history').prepend(item);
+            
+            // Самый старый элемент - первый в Map и последний в списке
+            while (historyItems.size > HISTORY_LIMIT) {
+                const [oldestId, oldestItem] = historyItems.entries().next().value;
+                oldestItem.remove();
+                historyItems.delete(oldestId);
             }
         }
         
@@ -642,12 +934,7 @@ DASHBOARD_HTML = """
         }
         
         function getNodeColor(module) {
-            const colors = {
-                '_F_SPECTRE': '#FF6B6B',
-                '_F_BUX': '#4ECDC4',
-                '_F_DOC': '#45B7D1'
-            };
-            return colors[module] || '#95E1D3';
+            return MODULE_COLORS[module] || '#95E1D3';
         }
         
         // Тестовая симуляция
@@ -700,28 +987,29 @@ DASHBOARD_HTML = """
                 }
             });
             
-            // Подключаемся к SSE
-            connectSSE();
-            
-            // Начальные обновления
-            updateStats();
-            updateCallHistory();
-            updateActiveCalls();
-            
-            // Периодические обновления
-            setInterval(updateStats, 5000);
-            setInterval(updateCallHistory, 3000);
-            setInterval(updateActiveCalls, 1000);
+            // Начальное состояние одним снимком, дальше списки и статистику обновляют события SSE
+            Promise.all([updateAll(), loadDictionary()]).then(([lastEventId]) => connectSSE(lastEventId));
         };
     </script>
 </body>
 </html>
 """
 
+# В шаблоне нет Jinja-выражений - отдаём готовые байты, сжатые один раз при импорте
+_DASHBOARD_BYTES = DASHBOARD_HTML.encode('utf-8')
+_DASHBOARD_GZ = gzip.compress(_DASHBOARD_BYTES, compresslevel=9)
+
+
 @app.route('/')
 def index():
     """Главная страница"""
-    return render_template_string(DASHBOARD_HTML)
+    headers = {'Cache-Control': 'public, max-age=300', 'Vary': 'Accept-Encoding'}
+    
+    if request.accept_encodings['gzip']:  # учитывает q-значения (gzip;q=0 - отказ)
+        headers['Content-Encoding'] = 'gzip'
+        return Response(_DASHBOARD_GZ, mimetype='text/html', headers=headers)
+    
+    return Response(_DASHBOARD_BYTES, mimetype='text/html', headers=headers)
 
 
 # ============================================================================
@@ -741,8 +1029,7 @@ def load_test_data():
         ('Get_CrossRate', '_F_BUX', [('from', 'STRING'), ('to', 'STRING')], 'Кросс-курс', 40),
     ]
     
-    for name, module, params, desc, lines in functions:
-        graph_builder.add_function(name, module, params, desc, lines)
+    graph_builder.add_functions(functions)
     
     # Добавляем вызовы
     calls = [
@@ -754,8 +1041,7 @@ def load_test_data():
         ('Get_NDFL_Nach', 'Get_Rate', 50),
     ]
     
-    for caller, callee, line in calls:
-        graph_builder.add_call(caller, callee, line)
+    graph_builder.add_calls(calls)
     
     print("✅ Тестовые данные загружены")
 
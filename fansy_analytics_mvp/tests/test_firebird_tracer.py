@@ -0,0 +1,31 @@
+"""
+Тесты firebird_tracer: разбор имён таблиц из SQL
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+pytest.importorskip('fdb')
+
+from firebird_tracer import FirebirdTracer
+
+
+@pytest.fixture
+def tracer():
+    return FirebirdTracer('localhost', 'test.fdb', 'SYSDBA', 'masterkey')
+
+
+@pytest.mark.parametrize('sql, tables', [
+    ('SELECT * FROM clients c JOIN orders o ON o.client_id = c.id', {'CLIENTS', 'ORDERS'}),
+    ('insert into Payments (id) values (1)', {'PAYMENTS'}),
+    ('UPDATE accounts SET balance = 0', {'ACCOUNTS'}),
+    ('UPDATE OR INSERT INTO rates (d, v) VALUES (?, ?) MATCHING (d)', {'RATES'}),
+    ('MERGE INTO target t USING source s ON t.id = s.id WHEN MATCHED THEN DELETE', set()),
+    ('SELECT max(id) FROM docs INTO :last_id', {'DOCS'}),
+])
+def test_extract_tables(tracer, sql, tables):
+    assert tracer._extract_tables(sql) == tables
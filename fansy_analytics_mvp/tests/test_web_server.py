@@ -0,0 +1,49 @@
+"""
+Тесты web_server: SSE-поток /api/events
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+pytest.importorskip('flask')
+pytest.importorskip('flask_cors')
+pytest.importorskip('networkx')
+pytest.importorskip('function_logger')
+
+import web_server
+
+
+def _first_chunk(url: str) -> bytes:
+    """Первый кусок потока и отписка клиента"""
+    client = web_server.app.test_client()
+    response = client.get(url, buffered=False)
+    chunks = iter(response.response)
+    try:
+        return next(chunks)
+    finally:
+        response.close()
+
+
+def test_events_stream_starts_immediately():
+    """Новый клиент сразу получает первый кадр, не дожидаясь событий и heartbeat"""
+    assert _first_chunk('/api/events') == web_server._STREAM_START
+
+
+def test_events_stream_starts_immediately_when_up_to_date():
+    """То же при подключении с номером последнего события - пропущенных событий нет"""
+    web_server.add_event('test', {'n': 1})
+    last_event_id = web_server.get_last_event_id()
+
+    assert _first_chunk(f'/api/events?last_event_id={last_event_id}') == web_server._STREAM_START
+
+
+def test_events_unsubscribe_on_close():
+    """Закрытый поток убирает очередь клиента из подписчиков"""
+    subscribers = len(web_server._subscribers)
+    _first_chunk('/api/events')
+
+    assert len(web_server._subscribers) == subscribers